@@ -134,11 +134,12 @@ async def _async_main(
         with open(final_output_path, "w", encoding="utf-8") as f:
             f.write(payload_str)
 
-        click.echo(f"Analysis complete! Output written to: {final_output_path}")
+        # Emit the whole completion report with a single echo (one write to stdout instead of three)
+        report = f"Analysis complete! Output written to: {final_output_path}"
         if output_format == 'txt':
-            click.echo("\nSummary:")
-            click.echo(ingestion_result["summary_str"]) # Use summary_str from result
+            report += f"\n\nSummary:\n{ingestion_result['summary_str']}" # Use summary_str from result
         # If JSON and output is to a file (which we assume for now), summary is in the file.
+        click.echo(report)
 
     except Exception as exc:
         click.echo(f"Error: {exc}", err=True)
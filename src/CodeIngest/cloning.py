@@ -1,17 +1,43 @@
 """This module contains functions for cloning a Git repository to a local path."""
 
+import asyncio
+import logging
 import os
-from pathlib import Path
+import re
+import shutil
+import stat
+import tempfile
+import zipfile
+from pathlib import Path, PurePosixPath
 from typing import Optional
+from urllib.parse import urlparse
 
+import httpx
+
+from CodeIngest.config import MAX_TOTAL_SIZE_BYTES
 from CodeIngest.schemas import CloneConfig
 from CodeIngest.utils.git_utils import check_repo_exists, ensure_git_installed, run_command
 from CodeIngest.utils.timeout_wrapper import async_timeout
 
 TIMEOUT: int = 60
+# The GitHub archive download gets its own budget, so a rejected or slow archive leaves `git clone` its full TIMEOUT
+ARCHIVE_TIMEOUT: int = 60
+
+# GitHub serves a ZIP snapshot of any branch, tag or HEAD without git history
+GITHUB_ARCHIVE_URL = "https://codeload.github.com/{owner}/{repo}/zip/{ref}"
+
+# Larger archives are not downloaded: more than ingestion would ever read, so clone instead
+MAX_ARCHIVE_SIZE = MAX_TOTAL_SIZE_BYTES
+
+# Network reads are regrouped into writes of this size, one worker-thread hand-off each
+_ARCHIVE_WRITE_CHUNK_SIZE = 1024 * 1024
+
+# Attributes that make an archive differ from a checkout (files left out or keywords expanded)
+_EXPORT_ATTRIBUTES_RE = re.compile(rb"\bexport-(?:ignore|subst)\b")
+
+logger = logging.getLogger(__name__)
 
 
-@async_timeout(TIMEOUT)
 async def clone_repo(config: CloneConfig) -> None:
     """
     Clone a repository to a local path based on the provided configuration.
@@ -20,6 +46,10 @@ async def clone_repo(config: CloneConfig) -> None:
     It can clone a specific branch or commit if provided, and it raises exceptions if
     any errors occur during the cloning process.
 
+    A plain snapshot of a GitHub repository (no commit, no subpath) is first fetched as a ZIP archive,
+    within its own ARCHIVE_TIMEOUT; if that does not apply or fails, `git clone` runs with the full
+    TIMEOUT of its own, unaffected by the time the archive attempt took.
+
     Parameters
     ----------
     config : CloneConfig
@@ -31,7 +61,21 @@ async def clone_repo(config: CloneConfig) -> None:
         If the repository is not found or if the provided URL is invalid.
     OSError
         If an error occurs while creating the parent directory for the repository.
+    AsyncTimeoutError
+        If `git clone` takes longer than TIMEOUT seconds.
     """
+    # A plain snapshot of a GitHub branch needs no git history: fetch the archive instead of cloning
+    if not config.commit and config.subpath == "/" and await _download_github_archive(
+        config.url, config.branch, config.local_path
+    ):
+        return
+
+    await _clone_repo(config)
+
+
+@async_timeout(TIMEOUT)
+async def _clone_repo(config: CloneConfig) -> None:
+    """Clone the repository described by `config` with `git clone` (see `clone_repo`)."""
     # Extract and validate query parameters
     url: str = config.url
     local_path: str = config.local_path
@@ -83,3 +127,116 @@ async def clone_repo(config: CloneConfig) -> None:
 
         # Check out the specific commit and/or subpath
         await run_command(*checkout_cmd)
+
+
+async def _download_github_archive(url: str, branch: Optional[str], local_path: str) -> bool:
+    """
+    Download and unpack the ZIP archive of a GitHub repository into `local_path`.
+
+    Parameters
+    ----------
+    url : str
+        The repository URL.
+    branch : str, optional
+        The branch or tag to download. The default branch is used if not provided (or "main"/"master",
+        mirroring the clone logic).
+    local_path : str
+        The directory the repository contents are unpacked into.
+
+    Returns
+    -------
+    bool
+        True if the repository was unpacked into `local_path`; False if `url` is not a GitHub repository
+        URL or the archive could not be fetched, in which case the caller should fall back to `git clone`.
+
+    Notes
+    -----
+    An archive is only used when it matches what `git clone` would check out. Archives larger than
+    MAX_ARCHIVE_SIZE, containing symlinks (stored as regular files holding the link target), or with
+    `.gitattributes` using `export-ignore`/`export-subst` (honoured by GitHub when building the archive)
+    fall back to cloning. A `.gitattributes` file that is itself export-ignored cannot be detected.
+    Such repositories are downloaded twice on every ingest (the rejected archive, then the clone); the
+    download is bounded by ARCHIVE_TIMEOUT so that cost stays capped.
+    """
+    parsed_url = urlparse(url)
+    path_parts = parsed_url.path.strip("/").split("/")
+    if parsed_url.hostname != "github.com" or len(path_parts) != 2:
+        return False
+
+    owner, repo = path_parts[0], path_parts[1].removesuffix(".git")
+    ref = branch if branch and branch.lower() not in ("main", "master") else "HEAD"
+    archive_url = GITHUB_ARCHIVE_URL.format(owner=owner, repo=repo, ref=ref)
+
+    try:
+        os.makedirs(Path(local_path).parent, exist_ok=True)
+        # Unpack next to local_path so the final move is a rename on the same filesystem
+        with tempfile.TemporaryDirectory(dir=Path(local_path).parent) as tmp_dir:
+            archive_path = Path(tmp_dir) / "archive.zip"
+            # Only the download is timed: extraction runs in a thread, which a timeout could not stop
+            await asyncio.wait_for(_fetch_archive(archive_url, archive_path), timeout=ARCHIVE_TIMEOUT)
+            await asyncio.to_thread(_extract_archive, archive_path, Path(local_path))
+    except (httpx.HTTPError, zipfile.BadZipFile, ValueError, OSError, asyncio.TimeoutError) as exc:
+        logger.info("GitHub archive download failed for %s, falling back to git clone: %s", url, str(exc) or type(exc).__name__)
+        shutil.rmtree(local_path, ignore_errors=True)
+        return False
+
+    return True
+
+
+async def _fetch_archive(archive_url: str, archive_path: Path) -> None:
+    """
+    Stream the archive at `archive_url` to `archive_path`.
+
+    Raises
+    ------
+    ValueError
+        If the archive is larger than MAX_ARCHIVE_SIZE.
+    """
+    async with httpx.AsyncClient(follow_redirects=True, timeout=ARCHIVE_TIMEOUT) as client:
+        async with client.stream("GET", archive_url) as response:
+            response.raise_for_status()
+            content_length = response.headers.get("content-length")
+            if content_length and int(content_length) > MAX_ARCHIVE_SIZE:
+                raise ValueError(f"Archive is larger than {MAX_ARCHIVE_SIZE} bytes")
+            received = 0
+            # Disk writes run in a worker thread, like the extraction: an archive can be hundreds of MB
+            f = await asyncio.to_thread(open, archive_path, "wb")
+            try:
+                # codeload streams archives without a Content-Length, so count while writing
+                async for chunk in response.aiter_bytes(_ARCHIVE_WRITE_CHUNK_SIZE):
+                    received += len(chunk)
+                    if received > MAX_ARCHIVE_SIZE:
+                        raise ValueError(f"Archive is larger than {MAX_ARCHIVE_SIZE} bytes")
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+
+
+def _extract_archive(archive_path: Path, local_path: Path) -> None:
+    """
+    Extract a GitHub archive into `local_path`, dropping the archive's single top-level directory.
+
+    Raises
+    ------
+    ValueError
+        If the archive contains an absolute or parent-relative path (Zip Slip), not exactly one top-level directory,
+        a symlink, or a `.gitattributes` file with export attributes (see `_download_github_archive`).
+    """
+    extract_dir = archive_path.parent / "extracted"
+    with zipfile.ZipFile(archive_path) as zf:
+        members = zf.infolist()
+        for member in members:
+            member_path = PurePosixPath(member.filename)
+            if member_path.is_absolute() or ".." in member_path.parts:
+                raise ValueError(f"ZIP contains unsafe path: {member.filename}")
+            # extractall would write the link target as file content, where a clone has a symlink
+            if stat.S_ISLNK(member.external_attr >> 16):
+                raise ValueError(f"Archive contains a symlink: {member.filename}")
+            if member_path.name == ".gitattributes" and _EXPORT_ATTRIBUTES_RE.search(zf.read(member)):
+                raise ValueError(f"Archive contents are altered by export attributes in {member.filename}")
+        top_level_dirs = {PurePosixPath(member.filename).parts[0] for member in members}
+        if len(top_level_dirs) != 1:
+            raise ValueError(f"Unexpected archive layout with top-level entries: {sorted(top_level_dirs)[:5]}")
+        zf.extractall(extract_dir)
+
+    os.replace(extract_dir / top_level_dirs.pop(), local_path)
@@ -2,7 +2,9 @@
 """Main entry point for ingesting a source and processing its contents."""
 
 import asyncio
+import functools
 import inspect
+import os
 import shutil
 from typing import Optional, Set, Tuple, Union, List, Dict, Any # Added List, Dict, Any
 
@@ -12,6 +14,10 @@ from CodeIngest.ingestion import ingest_query
 from CodeIngest.query_parsing import IngestionQuery, parse_query
 from CodeIngest.output_formatters import TreeDataItem # Import the type alias
 
+# Clones live under TMP_BASE_PATH/<id>/<slug>; a plain string prefix test avoids building PurePath parts per request.
+# Not resolved, because parse_query builds local_path from the unresolved TMP_BASE_PATH as well.
+_TMP_BASE_PREFIX = os.path.join(TMP_BASE_PATH, "")
+
 async def ingest_async(
     source: str,
     max_file_size: int = 10 * 1024 * 1024,  # 10 MB
@@ -59,9 +65,13 @@ async def ingest_async(
 
     finally:
         # (Cleanup logic remains the same)
-        if repo_cloned and query and query.local_path.is_relative_to(TMP_BASE_PATH):
-            if query.local_path.exists():
-                shutil.rmtree(query.local_path, ignore_errors=True)
+        if repo_cloned and query and os.fspath(query.local_path).startswith(_TMP_BASE_PREFIX):
+            # Deleting a clone is one unlink() per file; hand it to the default executor instead of
+            # blocking the event loop, and return the result without waiting for it to finish.
+            # (rmtree tolerates an already-missing path with ignore_errors=True.)
+            asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(shutil.rmtree, query.local_path, ignore_errors=True)
+            )
 
 
 def ingest(
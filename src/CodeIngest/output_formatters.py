@@ -1,7 +1,7 @@
 # src/CodeIngest/output_formatters.py
 """Functions to ingest and analyze a codebase directory or single file."""
 
-from typing import Optional, Tuple, List, Dict, Any
+from typing import Optional, Tuple, List, Dict, Any, Iterator
 import os
 from pathlib import Path # Import Path
 
@@ -64,10 +64,7 @@ def format_node(node: FileSystemNode, query: IngestionQuery) -> FormattedNodeDat
     tree_data: List[TreeDataItem] = _create_tree_data(node, repo_root_path=repo_root_path_for_links, parent_prefix="")
 
     # Create directory_structure_text_str from the (filtered) tree_data
-    dir_struct_lines = []
-    for item in tree_data:
-        dir_struct_lines.append(f"{item['prefix']}{item['name']}")
-    directory_structure_text_str = "\n".join(dir_struct_lines)
+    directory_structure_text_str = "\n".join([item['prefix'] + item['name'] for item in tree_data])
 
     # Calculate num_files_in_tree from the generated (and filtered) tree_data
     num_files_in_tree = sum(1 for item in tree_data if item['type'] == FileSystemNodeType.FILE.name)
@@ -113,12 +110,19 @@ def _create_summary_prefix(query: IngestionQuery, single_file: bool = False) ->
 
 # (_gather_file_contents remains the same)
 def _gather_file_contents(node: FileSystemNode) -> str:
-    # ... (implementation remains) ...
-    if node.type == FileSystemNodeType.FILE: return node.content_string
-    elif node.type == FileSystemNodeType.SYMLINK: return node.content_string
+    # One flat join: nested per-directory joins would copy each file's content once per directory level
+    return "".join(_iter_file_contents(node))
+
+
+def _iter_file_contents(node: FileSystemNode) -> Iterator[str]:
+    """Yield the pieces of `_gather_file_contents(node)` in order, separators included."""
+    if node.type in (FileSystemNodeType.FILE, FileSystemNodeType.SYMLINK):
+        yield node.content_string
     elif node.type == FileSystemNodeType.DIRECTORY:
-        return "\n".join(_gather_file_contents(child) for child in node.children)
-    return ""
+        for index, child in enumerate(node.children):
+            if index:
+                yield "\n"
+            yield from _iter_file_contents(child)
 
 
 # --- REVISED _create_tree_data to calculate full relative path ---
@@ -127,17 +131,22 @@ def _create_tree_data(
     repo_root_path: Path, # Add repo root path
     depth: int = 0,
     is_last_sibling: bool = True,
-    parent_prefix: str = ""
+    parent_prefix: str = "",
+    tree_list: Optional[List[TreeDataItem]] = None,
 ) -> List[TreeDataItem]:
     """
     Recursively generate structured data representing the file tree.
     Includes the correctly formatted prefix string, full relative path, and embedded file content.
     Symlinks are excluded.
+
+    Items are appended to `tree_list` (a new list when omitted), which is shared by the whole recursion so
+    that no item is copied once per ancestor directory.
     """
+    if tree_list is None:
+        tree_list = []
     if node.type == FileSystemNodeType.SYMLINK:
-        return [] # Do not include symlinks in the tree
+        return tree_list # Do not include symlinks in the tree
 
-    tree_list: List[TreeDataItem] = []
     prefix = parent_prefix + ("└── " if is_last_sibling else "├── ") if depth > 0 else parent_prefix
 
     # --- Construct Display Name ---
@@ -192,11 +201,12 @@ def _create_tree_data(
         for i, child_node in enumerate(processed_children):
             is_last = (i == num_processed_children - 1)
             # Pass repo_root_path down
-            # _create_tree_data itself will return [] for any symlinks if they somehow weren't pre-filtered,
+            # _create_tree_data itself adds nothing for any symlinks if they somehow weren't pre-filtered,
             # but pre-filtering here ensures correct is_last logic for siblings.
-            tree_list.extend(_create_tree_data(
-                child_node, repo_root_path, depth + 1, is_last_sibling=is_last, parent_prefix=child_indent
-            ))
+            _create_tree_data(
+                child_node, repo_root_path, depth + 1, is_last_sibling=is_last, parent_prefix=child_indent,
+                tree_list=tree_list,
+            )
 
     return tree_list
 
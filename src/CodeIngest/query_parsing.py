@@ -7,8 +7,9 @@ import warnings
 import os
 import shutil
 import zipfile
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional, Set, Union
+from typing import FrozenSet, List, Optional, Set, Union
 from urllib.parse import unquote, urlparse
 
 from CodeIngest.config import TMP_BASE_PATH
@@ -26,6 +27,8 @@ from CodeIngest.utils.query_parser_utils import (
     _validate_url_scheme,
 )
 
+_PATTERN_SEPARATOR_RE = re.compile(r'[,\s]+')
+
 
 async def parse_query(
     source: str,
@@ -53,33 +56,31 @@ async def parse_query(
             # If it's named .zip but isn't an existing file, it's likely a path error.
             raise ValueError(f"Local path not found: {source}")
         try:
-            # Attempt to open as ZIP - this raises BadZipFile if invalid
-            with zipfile.ZipFile(source_path, 'r') as zf_test:
-                _ = zf_test.testzip() # Basic integrity check
-
-            # If no error, it's a valid zip file path
-            source_type_determined = "zip"
-            # --- Handle ZIP Extraction ---
-            unique_id = str(uuid.uuid4())
-            base_extract_dir = TMP_BASE_PATH / "extracted_zips"; base_extract_dir.mkdir(parents=True, exist_ok=True)
-            temp_extract_path = base_extract_dir / unique_id; temp_extract_path.mkdir()
-            try:
-                with zipfile.ZipFile(source_path, 'r') as zip_ref:
+            # Open the archive once: a bad central directory raises BadZipFile here, and extraction itself
+            # verifies every member's CRC, so no separate testzip() pass (a full extra decompression) is needed
+            with zipfile.ZipFile(source_path, 'r') as zip_ref:
+                # If no error, it's a valid zip file path
+                source_type_determined = "zip"
+                # --- Handle ZIP Extraction ---
+                unique_id = str(uuid.uuid4())
+                base_extract_dir = TMP_BASE_PATH / "extracted_zips"; base_extract_dir.mkdir(parents=True, exist_ok=True)
+                temp_extract_path = base_extract_dir / unique_id; temp_extract_path.mkdir()
+                try:
                     for member in zip_ref.namelist():
                         if member.startswith('/') or '..' in member:
                             shutil.rmtree(temp_extract_path, ignore_errors=True); raise ValueError(f"ZIP contains unsafe path: {member}")
                     zip_ref.extractall(temp_extract_path)
-                local_path_for_query = temp_extract_path; slug = source_path.stem; original_zip_path = source_path.resolve()
-                query = IngestionQuery(
-                    local_path=local_path_for_query, slug=slug, id=unique_id, original_zip_path=original_zip_path, temp_extract_path=temp_extract_path,
-                    user_name=None, repo_name=None, url=None, subpath="/", type="zip", branch=None, commit=None,
-                )
-            except zipfile.BadZipFile as e: # Should ideally be caught by the first check
-                    if temp_extract_path and temp_extract_path.exists(): shutil.rmtree(temp_extract_path, ignore_errors=True)
-                    raise zipfile.BadZipFile(f"Invalid ZIP file (extraction failed): {source}") from e
-            except Exception as e:
-                    if temp_extract_path and temp_extract_path.exists(): shutil.rmtree(temp_extract_path, ignore_errors=True)
-                    raise ValueError(f"Error processing ZIP file '{source}': {e}") from e
+                    local_path_for_query = temp_extract_path; slug = source_path.stem; original_zip_path = source_path.resolve()
+                    query = IngestionQuery(
+                        local_path=local_path_for_query, slug=slug, id=unique_id, original_zip_path=original_zip_path, temp_extract_path=temp_extract_path,
+                        user_name=None, repo_name=None, url=None, subpath="/", type="zip", branch=None, commit=None,
+                    )
+                except zipfile.BadZipFile as e: # Corrupt member data, caught while extracting
+                        if temp_extract_path and temp_extract_path.exists(): shutil.rmtree(temp_extract_path, ignore_errors=True)
+                        raise zipfile.BadZipFile(f"Invalid ZIP file (extraction failed): {source}") from e
+                except Exception as e:
+                        if temp_extract_path and temp_extract_path.exists(): shutil.rmtree(temp_extract_path, ignore_errors=True)
+                        raise ValueError(f"Error processing ZIP file '{source}': {e}") from e
 
         except zipfile.BadZipFile as e:
              # It IS an existing file ending with .zip, but invalid. Raise BadZipFile.
@@ -249,16 +250,23 @@ async def _configure_branch_and_subpath(remaining_parts: List[str], url: str) ->
 
 def _parse_patterns(pattern: Union[str, Set[str]]) -> Set[str]:
     patterns_input = pattern if isinstance(pattern, set) else {pattern}
-    parsed_patterns: Set[str] = set()
-    for p in patterns_input: split_patterns = {part for part in re.split(r'[,\s]+', p) if part}; parsed_patterns.update(split_patterns)
-    parsed_patterns = {p.replace("\\", "/") for p in parsed_patterns}
-    validated_patterns = set()
-    for p in parsed_patterns:
-        if not _is_valid_pattern(p): raise InvalidPatternError(p)
-        validated_patterns.add(_normalize_pattern(p))
+    validated_patterns: Set[str] = set()
+    for p in patterns_input: validated_patterns.update(_parse_pattern_string(p))
     return validated_patterns
 
 
+@lru_cache(maxsize=1024)
+def _parse_pattern_string(pattern: str) -> FrozenSet[str]:
+    """Split, validate and normalize one pattern string. Cached: most requests reuse the same few pattern strings."""
+    validated_patterns = set()
+    for part in _PATTERN_SEPARATOR_RE.split(pattern):
+        if not part: continue
+        part = part.replace("\\", "/")
+        if not _is_valid_pattern(part): raise InvalidPatternError(part)
+        validated_patterns.add(_normalize_pattern(part))
+    return frozenset(validated_patterns)
+
+
 async def try_domains_for_user_and_repo(user_name: str, repo_name: str) -> str:
     for domain in KNOWN_GIT_HOSTS:
         candidate = f"https://{domain}/{user_name}/{repo_name}"
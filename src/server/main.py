@@ -1,7 +1,10 @@
 """Main module for the FastAPI application."""
 
+import atexit
 import os
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 from typing import Dict
 
@@ -19,11 +22,17 @@ from server.server_utils import lifespan, limiter, rate_limit_exception_handler
 # Load environment variables from .env file
 load_dotenv()
 
-# Configure basic logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure basic logging. Request handlers only enqueue records; a listener thread formats and writes them,
+# so a slow terminal or log collector never blocks the event loop.
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+_log_listener = QueueListener(_log_queue, _log_stream_handler, respect_handler_level=True)
+_log_queue_handler = QueueHandler(_log_queue)
+_log_queue_handler.setFormatter(logging.Formatter())  # Message (and traceback) only; the listener adds the layout
+logging.basicConfig(level=logging.INFO, handlers=[_log_queue_handler])
+_log_listener.start()
+atexit.register(_log_listener.stop)  # Flushes the records still queued
 
 # Initialize the FastAPI application with lifespan
 app = FastAPI(lifespan=lifespan)
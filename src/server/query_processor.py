@@ -1,12 +1,20 @@
 # src/server/query_processor.py
 """Process a query by parsing input, cloning a repository, and generating a summary."""
 
+import asyncio
+import errno
+import gzip
+import hashlib
 import os
 import json # Added import
 import re
-from functools import partial
+import secrets
+import string
+import uuid
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Iterable, Sequence, Tuple, Union
 
 from fastapi import Request, UploadFile
 from starlette.templating import _TemplateResponse
@@ -15,48 +23,301 @@ import zipfile # Ensure zipfile is imported
 import shutil  # Ensure shutil is imported
 import logging
 
+try:
+    import orjson  # Optional: C encoder for large JSON digests
+except ImportError:
+    orjson = None
+
 # --- Core CodeIngest imports ---
 from CodeIngest.entrypoint import ingest_async
 from CodeIngest.config import TMP_BASE_PATH
 from CodeIngest.output_formatters import TreeDataItem
+from CodeIngest.schemas import IngestionQuery
 from CodeIngest.utils.exceptions import GitError, InvalidPatternError # Assuming IngestionError might be too broad for now
 
 # --- Server specific imports ---
-from server.server_config import EXAMPLE_REPOS, MAX_DISPLAY_SIZE, templates
+from server.server_config import DIGEST_STORE_PATH, EXAMPLE_REPOS, MAX_DISPLAY_SIZE, templates
 from server.server_utils import log_slider_to_size
 
 # Define paths for zip handling
 RAW_UPLOADS_PATH = TMP_BASE_PATH / "uploads"
 EXTRACTED_ZIPS_PATH = TMP_BASE_PATH / "extracted"
-RAW_UPLOADS_PATH.mkdir(parents=True, exist_ok=True)
-EXTRACTED_ZIPS_PATH.mkdir(parents=True, exist_ok=True)
+_upload_dirs_ready = False # Set by ensure_upload_dirs once both directories exist
 
 logger = logging.getLogger(__name__)
 
+# Shown after the content preview when the content did not fit in MAX_DISPLAY_SIZE
+_CONTENT_CROPPED_NOTE = "\n(Files content cropped to first characters...)"
+
+# The git.jinja page shows no example repositories; one shared empty sequence instead of a new list per request
+_NO_EXAMPLES: Tuple[Tuple[str, str], ...] = ()
+
+class _SanitizeTable(dict):
+    """str.translate table for sanitize_filename_part: any code point not listed maps to the "\\0" separator."""
+    def __missing__(self, key: int) -> str:
+        return "\0"
+
+# Filename-safe characters map to themselves, filesystem-reserved ones are dropped, everything else
+# becomes a separator; runs of separators are then joined back with a single "_".
+_SANITIZE_TABLE = _SanitizeTable({ord(c): c for c in string.ascii_letters + string.digits + "._-"})
+_SANITIZE_TABLE.update(dict.fromkeys(map(ord, '\\/*?:"<>|')))
+
+# Classifies ValueError messages into user-facing categories in a single scan (see the ValueError handler)
+_VALUE_ERROR_RE = re.compile(
+    r"(?P<local_path>local path not found)|(?P<repo_access>repository not found|could not access)", re.IGNORECASE
+)
+
+# Query fields echoed into JSON digests. Leaves out the ignore/include pattern sets (hundreds of default entries,
+# the costliest part of model_dump) and server-side temp paths.
+_DIGEST_QUERY_FIELDS = {"id", "slug", "url", "branch", "commit", "subpath"}
+
+# Digests are stored gzip-compressed and served as-is with Content-Encoding: gzip (see routers/download.py).
+# Level 1 favours write speed; source text still shrinks several-fold.
+_DIGEST_GZIP_LEVEL = 1
+
+# os.link failures that mean "no hard link possible here" (other filesystem, unsupported, link count limit);
+# only these fall back to copying the stored digest
+_NO_HARD_LINK_ERRNOS = frozenset({errno.EXDEV, errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EMLINK})
+
+# Digest writes are CPU- and disk-heavy; cap how many occupy the default executor at once so a burst of large
+# ingests cannot starve page renders and clone cleanup, which share that pool
+_DIGEST_WRITE_SLOTS = asyncio.Semaphore(4)
+
+# Ingestions currently running, keyed by their arguments (see _ingest_single_flight)
+_INFLIGHT_INGESTS: Dict[tuple, "asyncio.Task[Dict[str, Any]]"] = {}
+
+# Only the first characters of a name part can reach the 50-character result, so longer user input is cut
+# before any scanning (and before it is kept as an lru_cache key)
+_SANITIZE_INPUT_LIMIT = 256
+
+# Name parts that are already safe (the usual repo names and branches): returned unchanged without a table pass
+_CLEAN_FILENAME_PART_RE = re.compile(r"[A-Za-z0-9-](?:[A-Za-z0-9._-]{0,48}[A-Za-z0-9-])?")
+
 def sanitize_filename_part(part: str) -> str:
     """Removes or replaces characters unsafe for filenames."""
     if not part: return ""
-    part = re.sub(r'[\\/*?:"<>|]+', '', part)
-    part = re.sub(r'[^a-zA-Z0-9._-]+', '_', part)
+    if _CLEAN_FILENAME_PART_RE.fullmatch(part): return part
+    return _sanitize_filename_part(part[:_SANITIZE_INPUT_LIMIT])
+
+
+@lru_cache(maxsize=4096)
+def _sanitize_filename_part(part: str) -> str:
+    # One translate pass instead of two regex substitutions; equivalent once the edges are stripped below
+    part = "_".join(filter(None, part.translate(_SANITIZE_TABLE).split("\0")))
     part = part.strip('._')
     return part[:50]
 
 
-async def process_query(
+def ensure_upload_dirs(recheck: bool = False) -> None:
+    """
+    Create the ZIP upload and extraction directories on first use rather than at import.
+
+    Pass `recheck=True` after a FileNotFoundError: the cleanup task may have removed them since.
+    """
+    global _upload_dirs_ready
+    if _upload_dirs_ready and not recheck:
+        return
+    RAW_UPLOADS_PATH.mkdir(parents=True, exist_ok=True)
+    EXTRACTED_ZIPS_PATH.mkdir(parents=True, exist_ok=True)
+    _upload_dirs_ready = True
+
+
+@lru_cache(maxsize=256)
+def _ensure_dir(path: str) -> None:
+    """Create `path` (and parents) once per process; the 256 store fan-out directories are shared by all requests."""
+    os.makedirs(path, exist_ok=True)
+
+
+def _store_digest(store_path: Path, chunks: Sequence[str]) -> None:
+    """Write `chunks` gzip-compressed to `store_path`, atomically."""
+    tmp_path = store_path.with_name(f"{store_path.stem}.{secrets.token_hex(16)}.tmp")
+    try:
+        _ensure_dir(str(store_path.parent))
+        try:
+            digest_file = gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=_DIGEST_GZIP_LEVEL)
+        except FileNotFoundError:
+            # The store directory was removed after it was remembered
+            _ensure_dir.cache_clear()
+            _ensure_dir(str(store_path.parent))
+            digest_file = gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=_DIGEST_GZIP_LEVEL)
+        with digest_file as f:
+            f.writelines(chunks)
+        os.replace(tmp_path, store_path)  # Atomic, so a concurrent request never links a partial file
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def _link_digest(store_path: Path, compressed_path: Path) -> None:
+    """Hard-link the stored digest to `compressed_path`, copying it where hard links are not possible."""
+    try:
+        os.link(store_path, compressed_path)
+    except FileExistsError:
+        # Written before for this ingest: nothing to do if it already is the stored digest
+        if not os.path.samefile(store_path, compressed_path):
+            raise
+    except OSError as exc:
+        if exc.errno not in _NO_HARD_LINK_ERRNOS:
+            raise
+        # Filesystem without hard links: fall back to a private copy
+        shutil.copyfile(store_path, compressed_path)
+
+
+def _write_digest(digest_path: Path, chunks: Iterable[str]) -> None:
+    """
+    Write the digest chunks gzip-compressed to `<digest_path>.gz`, in order, without joining them into one string first.
+
+    Digests are content-addressed: the compressed file lives once in DIGEST_STORE_PATH under the BLAKE2b hash
+    of its name and chunks, and is hard-linked into the ingest directory. Re-ingesting an unchanged source
+    writes no new digest bytes.
+    """
+    chunks = tuple(chunks)
+    hasher = hashlib.blake2b(digest_path.name.encode("utf-8"), digest_size=32)
+    for chunk in chunks:
+        hasher.update(chunk.encode("utf-8"))
+    key = hasher.hexdigest()
+
+    store_path = DIGEST_STORE_PATH / key[:2] / f"{key}.gz"
+    if not store_path.is_file():
+        _store_digest(store_path, chunks)
+
+    compressed_path = digest_path.with_name(digest_path.name + ".gz")
+    try:
+        _link_digest(store_path, compressed_path)
+    except FileNotFoundError:
+        if store_path.exists():
+            raise # The ingest directory is missing, not the stored digest
+        # The cleanup task expired the stored digest between the check above and the link: write it again
+        _store_digest(store_path, chunks)
+        _link_digest(store_path, compressed_path)
+
+
+async def _ingest_single_flight(**ingest_kwargs: Any) -> Dict[str, Any]:
+    """
+    Run `ingest_async` once per distinct set of arguments among concurrent requests.
+
+    A request arriving while an identical ingestion is still in flight awaits that ingestion's
+    result (or exception) instead of cloning and ingesting the same source a second time. Each
+    follower gets a copy of the query with a fresh id, so it saves its digest (possibly in another
+    format) to its own directory rather than racing the leader for the same files.
+
+    The ingestion runs in its own task that every requester awaits through a shield, so a requester
+    being cancelled (client disconnect) never cancels it for the others.
+    """
+    key = tuple(sorted(ingest_kwargs.items()))
+    task = _INFLIGHT_INGESTS.get(key)
+    if task is None:
+        task = asyncio.create_task(ingest_async(**ingest_kwargs))
+        _INFLIGHT_INGESTS[key] = task
+        task.add_done_callback(partial(_finish_inflight_ingest, key))
+        return await asyncio.shield(task)
+
+    result = await asyncio.shield(task)
+    query_obj = result["query_obj"]
+    if query_obj is None:
+        return result
+    return {**result, "query_obj": query_obj.model_copy(update={"id": str(uuid.uuid4())})}
+
+
+def _finish_inflight_ingest(key: tuple, task: "asyncio.Task[Dict[str, Any]]") -> None:
+    """Done callback of a single-flight ingestion: stop routing new requests to it."""
+    if _INFLIGHT_INGESTS.get(key) is task:
+        del _INFLIGHT_INGESTS[key]
+    if not task.cancelled():
+        task.exception() # Mark as retrieved; every requester may have gone away
+
+
+async def _write_digest_off_loop(digest_path: Path, chunks: Iterable[str]) -> None:
+    """Run `_write_digest` in a worker thread, with at most four digest writes in flight."""
+    # Hashing, compressing and writing a multi-MB digest would otherwise stall every other request
+    async with _DIGEST_WRITE_SLOTS:
+        await asyncio.to_thread(_write_digest, digest_path, chunks)
+
+
+def _download_filename(query_obj: IngestionQuery, source_type: str, branch_or_tag: str, download_format: str) -> str:
+    """Suggested filename for a digest download: `<slug>[_<ref or short commit>].<txt|json>`."""
+    file_ext = ".json" if download_format == "json" else ".txt"
+    filename_parts = []
+    project_name_part = query_obj.slug # Slug from IngestionQuery (e.g., zip filename stem or repo name)
+    sanitized_project_name = sanitize_filename_part(project_name_part)
+    filename_parts.append(sanitized_project_name or "digest")
+
+    # For remote repos, add branch/tag/commit if provided
+    ref_for_filename = branch_or_tag if (source_type == 'url_path' and branch_or_tag) else query_obj.branch
+    if source_type == 'url_path' and query_obj.url: # It's a remote repo
+        if ref_for_filename:
+            sanitized_ref = sanitize_filename_part(ref_for_filename)
+            if sanitized_ref: filename_parts.append(sanitized_ref)
+        elif query_obj.commit: # Fallback to commit if no specific ref for filename
+            sanitized_commit = sanitize_filename_part(query_obj.commit[:7])
+            if sanitized_commit: filename_parts.append(sanitized_commit)
+
+    return "_".join(filename_parts) + file_ext
+
+
+def _dump_json(data: Dict[str, Any]) -> str:
+    """Serialize a JSON digest with two-space indentation, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(data, indent=2)
+
+
+def _input_error_response(
     request: Request,
-    source_type: str,
-    input_text: Optional[str], # For url_path OR path to the saved ZIP file
-    zip_file: Optional[UploadFile], # Original UploadFile object for metadata
+    template: str,
+    examples: Sequence[Tuple[str, str]],
+    error_message: str,
+    repo_url: Optional[str],
     slider_position: int,
-    pattern_type: str = "exclude",
-    pattern: str = "",
-    branch_or_tag: str = "",
-    download_format: str = "txt", # Added download_format
-    is_index: bool = False,
+    pattern_type: str,
+    pattern: str,
+    branch_or_tag: str,
+    source_type: str,
 ) -> _TemplateResponse:
+    """Render the form again with a 400 status when the submitted source is missing or invalid."""
+    return templates.TemplateResponse(
+        template,
+        {"request": request, "error_message": error_message,
+         "repo_url": repo_url, "examples": examples,
+         "default_file_size": slider_position, "pattern_type": pattern_type,
+         "pattern": pattern, "branch_or_tag": branch_or_tag, "source_type": source_type},
+        status_code=400
+    )
+
+
+@dataclass(slots=True)
+class ValidatedQuery:
+    """Form inputs of ``process_query`` once validated and resolved for ingestion."""
+
+    source_for_ingest: str
+    include_patterns: Optional[str]
+    exclude_patterns: Optional[str]
+    effective_input_display: str
+    original_filename_for_slug: Optional[str]
+    template: str
+    examples: Sequence[Tuple[str, str]]
+    branch_or_tag: str  # Cleared for ZIP uploads
+    max_file_size: int
+
+
+def _validate(
+    request: Request,
+    source_type: str,
+    input_text: Optional[str],
+    zip_file: Optional[UploadFile],
+    slider_position: int,
+    pattern_type: str,
+    pattern: str,
+    branch_or_tag: str,
+    is_index: bool,
+) -> Union[ValidatedQuery, _TemplateResponse]:
     """
-    Process a query (from URL/path or ZIP), generate summary, save digest (TXT or JSON), and prepare response.
+    Check the submitted form and resolve what to ingest.
+
+    Returns a ``ValidatedQuery`` on success, or the 400 response to send back when the source is missing or invalid.
     """
+    template = "index.jinja" if is_index else "git.jinja"
+    examples = EXAMPLE_REPOS if is_index else _NO_EXAMPLES
+
     source_for_ingest: Optional[str] = None
     effective_input_display = ""
     original_filename_for_slug = None # For ZIPs, to create a nice slug for display
@@ -64,77 +325,92 @@ async def process_query(
     # Determine the actual source for ingestion based on source_type
     if source_type == "url_path":
         if not input_text:
-            return templates.TemplateResponse(
-                "index.jinja" if is_index else "git.jinja",
-                {"request": request, "error_message": "Please provide a URL or local path.",
-                 "repo_url": input_text, "examples": EXAMPLE_REPOS if is_index else [],
-                 "default_file_size": slider_position, "pattern_type": pattern_type,
-                 "pattern": pattern, "branch_or_tag": branch_or_tag, "source_type": source_type},
-                status_code=400
+            return _input_error_response(
+                request, template, examples, "Please provide a URL or local path.", input_text,
+                slider_position, pattern_type, pattern, branch_or_tag, source_type,
             )
         source_for_ingest = input_text
         effective_input_display = input_text
     elif source_type == "zip_file":
         # 'input_text' should be the path to the saved zip file, set by the router
         if not input_text or not Path(input_text).is_file():
-            return templates.TemplateResponse(
-                "index.jinja" if is_index else "git.jinja",
-                {"request": request, "error_message": "Uploaded ZIP file path is missing or invalid.",
-                 "repo_url": None, "examples": EXAMPLE_REPOS if is_index else [],
-                 "default_file_size": slider_position, "pattern_type": pattern_type,
-                 "pattern": pattern, "branch_or_tag": branch_or_tag, "source_type": source_type},
-                status_code=400
+            return _input_error_response(
+                request, template, examples, "Uploaded ZIP file path is missing or invalid.", None,
+                slider_position, pattern_type, pattern, branch_or_tag, source_type,
             )
         source_for_ingest = input_text # This is the path to the saved zip
         original_filename_for_slug = zip_file.filename if zip_file else Path(input_text).name
         effective_input_display = f"ZIP: {original_filename_for_slug}"
         branch_or_tag = "" # Clear branch/tag for ZIPs as it's not applicable
     else:
-         return templates.TemplateResponse(
-             "index.jinja" if is_index else "git.jinja",
-             {"request": request, "error_message": "Invalid source type specified.",
-              "repo_url": input_text, "examples": EXAMPLE_REPOS if is_index else [],
-              "default_file_size": slider_position, "pattern_type": pattern_type,
-              "pattern": pattern, "branch_or_tag": branch_or_tag, "source_type": source_type},
-             status_code=400
+         return _input_error_response(
+             request, template, examples, "Invalid source type specified.", input_text,
+             slider_position, pattern_type, pattern, branch_or_tag, source_type,
          )
 
+    # A blank or whitespace-only field (what the form sends by default) means no patterns: skip parsing them
+    # downstream, and let such requests share one single-flight key
+    patterns = pattern if pattern and not pattern.isspace() else None
     if pattern_type == "include":
-        include_patterns = pattern
+        include_patterns = patterns
         exclude_patterns = None
     elif pattern_type == "exclude":
-        exclude_patterns = pattern
+        exclude_patterns = patterns
         include_patterns = None
     else:
         # This should ideally not be reached if pattern_type comes from a select element
         raise ValueError(f"Invalid pattern type: {pattern_type}")
 
-    template = "index.jinja" if is_index else "git.jinja"
-    max_file_size = log_slider_to_size(slider_position)
+    return ValidatedQuery(
+        source_for_ingest=source_for_ingest,
+        include_patterns=include_patterns,
+        exclude_patterns=exclude_patterns,
+        effective_input_display=effective_input_display,
+        original_filename_for_slug=original_filename_for_slug,
+        template=template,
+        examples=examples,
+        branch_or_tag=branch_or_tag,
+        max_file_size=log_slider_to_size(slider_position),
+    )
+
 
-    # Initialize context for the template
-    context = {
+async def _run_ingest(
+    request: Request,
+    inputs: ValidatedQuery,
+    source_type: str,
+    input_text: Optional[str],
+    slider_position: int,
+    pattern_type: str,
+    pattern: str,
+    download_format: str,
+) -> _TemplateResponse:
+    """Ingest a validated query, save its digest (TXT or JSON), and render the result page."""
+    template = inputs.template
+    effective_input_display = inputs.effective_input_display
+    original_filename_for_slug = inputs.original_filename_for_slug
+    branch_or_tag = inputs.branch_or_tag
+    max_file_size = inputs.max_file_size
+
+    # Template context shared by every response below; each return site builds its final dict from it exactly once
+    base_context = {
         "request": request,
         "repo_url": input_text if source_type == "url_path" else original_filename_for_slug, # Display original input or zip name
-        "examples": EXAMPLE_REPOS if is_index else [],
+        "examples": inputs.examples,
         "default_file_size": slider_position,
         "pattern_type": pattern_type,
         "pattern": pattern,
         "branch_or_tag": branch_or_tag, # Display user's original branch input
-        "result": False, "error_message": None, "summary": None,
-        "tree_data": None, "content": None, "ingest_id": None,
-        "is_local_path": False, "encoded_download_filename": None,
-        "base_repo_url": None, "repo_ref": None, "download_format": download_format, # Added download_format to context
+        "download_format": download_format,
     }
     query_obj_from_ingest = None
 
     try:
         # Call the core ingest function, which now returns a dictionary
-        ingestion_result = await ingest_async(
-            source=source_for_ingest,
+        ingestion_result = await _ingest_single_flight(
+            source=inputs.source_for_ingest,
             max_file_size=max_file_size,
-            include_patterns=include_patterns,
-            exclude_patterns=exclude_patterns,
+            include_patterns=inputs.include_patterns,
+            exclude_patterns=inputs.exclude_patterns,
             branch=branch_or_tag if source_type == 'url_path' and branch_or_tag else None
         )
         query_obj_from_ingest = ingestion_result["query_obj"] # Extract for convenience
@@ -145,14 +421,18 @@ async def process_query(
                 effective_input_display, max_file_size, pattern_type, pattern, branch_or_tag,
                 exc_info=True  # Include stack trace for unexpected internal errors
             )
-            context["error_message"] = "An unexpected error occurred: Ingestion ID missing."
-            return templates.TemplateResponse(template, context=context)
+            return templates.TemplateResponse(
+                template,
+                context={**base_context, "result": False, "error_message": "An unexpected error occurred: Ingestion ID missing."},
+            )
 
         ingest_id_for_download = query_obj_from_ingest.id
         temp_digest_dir = TMP_BASE_PATH / ingest_id_for_download
-        os.makedirs(temp_digest_dir, exist_ok=True)
+        # Path.mkdir tries mkdir() first and only walks up on FileNotFoundError: one syscall in the usual case,
+        # where os.makedirs stats the parent first
+        await asyncio.to_thread(temp_digest_dir.mkdir, parents=True, exist_ok=True)
 
-        file_content_to_write = ""
+        digest_chunks: Iterable[str] = ()
         actual_internal_filename = ""
         if download_format == "json":
             actual_internal_filename = "digest.json"
@@ -169,110 +449,103 @@ async def process_query(
                 "summary": ingestion_result["summary_str"],
                 "metadata": metadata_obj,
                 "tree": ingestion_result["tree_data"], # This is tree_data_with_embedded_content
-                "query": query_obj_from_ingest.model_dump(mode='json') if query_obj_from_ingest else None
+                "query": query_obj_from_ingest.model_dump(mode='json', include=_DIGEST_QUERY_FIELDS) if query_obj_from_ingest else None
             }
-            file_content_to_write = json.dumps(data_to_save, indent=2)
+            digest_chunks = (_dump_json(data_to_save),)
         else: # Default to txt
             actual_internal_filename = "digest.txt"
-            # Use directory_structure_text and concatenated_content from ingestion_result
-            file_content_to_write = f"Directory structure:\n{ingestion_result['directory_structure_text']}\n\n{ingestion_result['concatenated_content']}"
+            # Use directory_structure_text and concatenated_content from ingestion_result.
+            # Kept as separate chunks so the (potentially multi-MB) content is never copied into a joined string.
+            digest_chunks = (
+                "Directory structure:\n",
+                ingestion_result['directory_structure_text'],
+                "\n\n",
+                ingestion_result['concatenated_content'],
+            )
 
         digest_path = temp_digest_dir / actual_internal_filename
 
+        # Start the digest write, then prepare the page while it runs in a worker thread
+        write_task = asyncio.create_task(_write_digest_off_loop(digest_path, digest_chunks))
+
+        download_filename = _download_filename(query_obj_from_ingest, source_type, branch_or_tag, download_format)
+
+        # Only the first MAX_DISPLAY_SIZE characters are rendered; the cropping note is rendered after them by the
+        # template rather than appended here, which would copy the whole preview once more
+        concatenated_content = ingestion_result["concatenated_content"]
+        content_preview = concatenated_content[:MAX_DISPLAY_SIZE]
+        content_note = _CONTENT_CROPPED_NOTE if len(concatenated_content) > MAX_DISPLAY_SIZE else ""
+
+        digest_error_message = None
         try:
-            with open(digest_path, "w", encoding="utf-8") as f:
-                f.write(file_content_to_write)
+            await write_task
         except OSError as e:
             logger.error("Error writing digest file %s: %s", digest_path, e, exc_info=True)
             ingest_id_for_download = None # Invalidate if save failed
-            context["error_message"] = f"Error saving digest: {e}"
-
-
-        # Determine Download Filename
-        file_ext = ".json" if download_format == "json" else ".txt"
-        filename_parts = []
-        project_name_part = query_obj_from_ingest.slug # Slug from IngestionQuery (e.g., zip filename stem or repo name)
-        sanitized_project_name = sanitize_filename_part(project_name_part)
-        filename_parts.append(sanitized_project_name or "digest")
-
-        # For remote repos, add branch/tag/commit if provided
-        ref_for_filename = branch_or_tag if (source_type == 'url_path' and branch_or_tag) else query_obj_from_ingest.branch
-        if source_type == 'url_path' and query_obj_from_ingest.url: # It's a remote repo
-            if ref_for_filename:
-                sanitized_ref = sanitize_filename_part(ref_for_filename)
-                if sanitized_ref: filename_parts.append(sanitized_ref)
-            elif query_obj_from_ingest.commit: # Fallback to commit if no specific ref for filename
-                sanitized_commit = sanitize_filename_part(query_obj_from_ingest.commit[:7])
-                if sanitized_commit: filename_parts.append(sanitized_commit)
-
-        download_filename = "_".join(filename_parts) + file_ext
-        encoded_download_filename = quote(download_filename)
-
-        # Prepare content for display (cropping if too large)
-        concatenated_content_for_ui = ingestion_result["concatenated_content"]
-        content_to_display = concatenated_content_for_ui[:MAX_DISPLAY_SIZE] + ("\n(Files content cropped to first characters...)" if len(concatenated_content_for_ui) > MAX_DISPLAY_SIZE else "")
-
-        # Prepare a concise summary for logging
-        summary_for_log = "N/A"
-        try:
-            token_line = next((line for line in ingestion_result["summary_str"].splitlines() if "Estimated tokens:" in line), None)
-            if token_line:
-                summary_for_log = token_line.strip()
-        except Exception:
-            pass # Keep N/A if parsing fails
+            digest_error_message = f"Error saving digest: {e}"
+
+        # Link the download only if there is a digest to download
+        encoded_download_filename = quote(download_filename) if ingest_id_for_download else None
 
         logger.info(
-            "Processing successful for '%s'. Summary: %s. Details: max_file_size=%s, pattern_type=%s, pattern='%s', branch_or_tag='%s'",
-            effective_input_display, summary_for_log, max_file_size, pattern_type, pattern, branch_or_tag
+            "Processing successful for '%s'. Summary: Estimated tokens: %s. Details: max_file_size=%s, pattern_type=%s, pattern='%s', branch_or_tag='%s'",
+            effective_input_display, ingestion_result["num_tokens"] or "N/A", # Parsed by ingestion, no need to re-scan the summary
+            max_file_size, pattern_type, pattern, branch_or_tag
         )
 
-        context.update({
+        # The success page embeds up to MAX_DISPLAY_SIZE characters of content plus the whole tree,
+        # so render it in a worker thread instead of blocking the event loop for every other request.
+        return await asyncio.to_thread(templates.TemplateResponse, template, context={
+            **base_context,
             "result": True,
+            "error_message": digest_error_message,
             "summary": ingestion_result["summary_str"],
             "tree_data": ingestion_result["tree_data"],
-            "content": content_to_display,
+            "content": content_preview,
+            "content_note": content_note,
             "ingest_id": ingest_id_for_download,
             "is_local_path": not query_obj_from_ingest.url and source_type != 'zip_file', # True if local dir/file
-            "encoded_download_filename": encoded_download_filename if ingest_id_for_download else None,
+            "encoded_download_filename": encoded_download_filename,
             "base_repo_url": query_obj_from_ingest.url if query_obj_from_ingest.url else None,
             "repo_ref": query_obj_from_ingest.branch or query_obj_from_ingest.commit or 'main',
-            # download_format is already added to context initialization
         })
-        return templates.TemplateResponse(template, context=context)
 
     except GitError as e:
         logger.error("GitError occurred while processing '%s': %s. Details: max_file_size=%s, pattern_type=%s, pattern='%s', branch_or_tag='%s'",
                      effective_input_display, e, max_file_size, pattern_type, pattern, branch_or_tag, exc_info=True)
-        context["error_message"] = f"Git operation failed: {e}. Ensure your Git URL is correct, the repository is accessible, and Git is installed on the server."
-        return templates.TemplateResponse(template, context=context, status_code=500) # Or 400 if client error
+        error_message = f"Git operation failed: {e}. Ensure your Git URL is correct, the repository is accessible, and Git is installed on the server."
+        return templates.TemplateResponse(template, context={**base_context, "result": False, "error_message": error_message}, status_code=500) # Or 400 if client error
 
     except zipfile.BadZipFile as e:
         logger.error("BadZipFile occurred while processing '%s': %s. Details: max_file_size=%s, pattern_type=%s, pattern='%s'",
                      effective_input_display, e, max_file_size, pattern_type, pattern, exc_info=True)
-        context["error_message"] = f"The uploaded file '{original_filename_for_slug or effective_input_display}' is not a valid ZIP file or is corrupted. Details: {e}"
-        return templates.TemplateResponse(template, context=context, status_code=400)
+        error_message = f"The uploaded file '{original_filename_for_slug or effective_input_display}' is not a valid ZIP file or is corrupted. Details: {e}"
+        return templates.TemplateResponse(template, context={**base_context, "result": False, "error_message": error_message}, status_code=400)
 
     except InvalidPatternError as e:
         logger.error("InvalidPatternError occurred for '%s': %s. Details: max_file_size=%s, pattern_type=%s, pattern='%s'",
-                     effective_input_display, e, max_file_size, pattern_type, pattern, exc_info=True)
-        context["error_message"] = f"Invalid include/exclude pattern provided: {e}"
-        return templates.TemplateResponse(template, context=context, status_code=400)
+                     effective_input_display, e, max_file_size, pattern_type, pattern,
+                     exc_info=logger.isEnabledFor(logging.DEBUG)) # Client error: traceback only useful when debugging
+        error_message = f"Invalid include/exclude pattern provided: {e}"
+        return templates.TemplateResponse(template, context={**base_context, "result": False, "error_message": error_message}, status_code=400)
 
     except ValueError as e:
         logger.warning(
             "ValueError during processing for '%s': %s. Details: max_file_size=%s, pattern_type=%s, pattern='%s', branch_or_tag='%s'",
             effective_input_display, e, max_file_size, pattern_type, pattern, branch_or_tag,
-            exc_info=True # ValueErrors can sometimes have useful stack traces for debugging config issues
+            # ValueErrors can have useful stack traces for config issues, but they are client errors: only format them when debugging
+            exc_info=logger.isEnabledFor(logging.DEBUG)
         )
-        str_e_lower = str(e).lower()
-        if "local path not found" in str_e_lower:
-            context["error_message"] = f"Error: Local path not found: {effective_input_display}"
-        elif "repository not found" in str_e_lower or "could not access" in str_e_lower: # Catchall for repo access issues not caught by GitError
-            context["error_message"] = f"Error: Could not access '{effective_input_display}'. Ensure URL/path is correct, public, and branch/tag/commit exists."
+        error_match = _VALUE_ERROR_RE.search(str(e))
+        error_kind = error_match.lastgroup if error_match else None
+        if error_kind == "local_path":
+            error_message = f"Error: Local path not found: {effective_input_display}"
+        elif error_kind == "repo_access": # Catchall for repo access issues not caught by GitError
+            error_message = f"Error: Could not access '{effective_input_display}'. Ensure URL/path is correct, public, and branch/tag/commit exists."
         # "invalid characters" for patterns should ideally be caught by InvalidPatternError if parsing is robust
         else:
-            context["error_message"] = f"Invalid input or configuration: {e}"
-        return templates.TemplateResponse(template, context=context, status_code=400)
+            error_message = f"Invalid input or configuration: {e}"
+        return templates.TemplateResponse(template, context={**base_context, "result": False, "error_message": error_message}, status_code=400)
 
     except Exception as exc:
         logger.error(
@@ -281,5 +554,32 @@ async def process_query(
             exc_info=True
         )
         # Generic error message for unexpected issues
-        context["error_message"] = f"An unexpected error occurred while processing '{effective_input_display}'. Please try again or contact support if the issue persists."
-        return templates.TemplateResponse(template, context=context, status_code=500)
\ No newline at end of file
+        error_message = f"An unexpected error occurred while processing '{effective_input_display}'. Please try again or contact support if the issue persists."
+        return templates.TemplateResponse(template, context={**base_context, "result": False, "error_message": error_message}, status_code=500)
+
+
+async def process_query(
+    request: Request,
+    source_type: str,
+    input_text: Optional[str], # For url_path OR path to the saved ZIP file
+    zip_file: Optional[UploadFile], # Original UploadFile object for metadata
+    slider_position: int,
+    pattern_type: str = "exclude",
+    pattern: str = "",
+    branch_or_tag: str = "",
+    download_format: str = "txt", # Added download_format
+    is_index: bool = False,
+) -> _TemplateResponse:
+    """
+    Process a query (from URL/path or ZIP), generate summary, save digest (TXT or JSON), and prepare response.
+    """
+    inputs = _validate(
+        request, source_type, input_text, zip_file, slider_position,
+        pattern_type, pattern, branch_or_tag, is_index,
+    )
+    if not isinstance(inputs, ValidatedQuery):
+        return inputs  # 400 response for a missing or invalid source
+    return await _run_ingest(
+        request, inputs, source_type, input_text, slider_position,
+        pattern_type, pattern, download_format,
+    )
@@ -1,17 +1,70 @@
 """This module contains the FastAPI router for downloading a digest file."""
 
+import gzip
 import os # Ensure os is imported
 import re
+import stat
 from pathlib import Path
-from typing import Optional
-from fastapi import APIRouter, HTTPException, Query, Request
-from fastapi.responses import FileResponse
+from typing import Iterator, Optional
+from urllib.parse import quote
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 
 from CodeIngest.config import TMP_BASE_PATH
 from server.server_utils import limiter # Added import
 
 router = APIRouter()
 
+_DECOMPRESS_CHUNK_SIZE = 64 * 1024
+
+
+def _iter_decompressed(path: Path) -> Iterator[bytes]:
+    """Yield the decompressed bytes of a gzip file in fixed-size chunks."""
+    with gzip.open(path, "rb") as f:
+        while chunk := f.read(_DECOMPRESS_CHUNK_SIZE):
+            yield chunk
+
+
+def _content_disposition(filename: str) -> str:
+    """Build an attachment Content-Disposition header the same way Starlette's FileResponse does."""
+    quoted_filename = quote(filename)
+    if quoted_filename != filename:
+        return f"attachment; filename*=utf-8''{quoted_filename}"
+    return f'attachment; filename="{filename}"'
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Whether an Accept-Encoding header value allows a gzip-encoded response.
+
+    Codings listed with ``q=0`` are refused; an explicit ``gzip`` (or ``x-gzip``) entry takes precedence over ``*``.
+    """
+    wildcard_accepted = False
+    for coding_with_params in accept_encoding.lower().split(","):
+        coding, *params = (part.strip() for part in coding_with_params.split(";"))
+        qvalue = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0 # Malformed weight: do not assume the coding is wanted
+        if coding in ("gzip", "x-gzip"):
+            return qvalue > 0
+        if coding == "*":
+            wildcard_accepted = qvalue > 0
+    return wildcard_accepted
+
+
+def _stat_regular_file(path: Path) -> Optional[os.stat_result]:
+    """Return the stat result of `path` if it is a regular file, else None."""
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    return stat_result if stat.S_ISREG(stat_result.st_mode) else None
+
 
 @router.get("/download/{digest_id}")
 @limiter.limit("30/minute") # Added rate limit decorator
@@ -19,13 +72,15 @@ async def download_ingest(
     request: Request, # Added request parameter
     digest_id: str,
     filename: Optional[str] = Query(None, description="Desired filename for the download (e.g., my_repo_main.txt or my_repo_main.json).")
-) -> FileResponse:
+) -> Response:
     """
     Download the digest file (TXT or JSON) associated with a given digest ID.
     The client suggests the full filename including extension, which indicates the desired format.
 
     Searches for 'digest.txt' or 'digest.json' within the temporary directory
     corresponding to the digest ID, based on the requested filename's extension.
+    Digests stored gzip-compressed ('digest.txt.gz') are sent as-is with
+    `Content-Encoding: gzip` to clients that accept it, and decompressed on the fly otherwise.
 
     Parameters
     ----------
@@ -40,8 +95,8 @@ async def download_ingest(
 
     Returns
     -------
-    FileResponse
-        A FastAPI FileResponse object streaming the content of the digest file.
+    FileResponse or StreamingResponse
+        A response streaming the content of the digest file.
         Media type is set to 'text/plain' or 'application/json'.
 
     Raises
@@ -56,9 +111,15 @@ async def download_ingest(
     internal_file_to_find = "digest.json" if requested_ext == ".json" else "digest.txt"
     media_type_for_response = "application/json" if internal_file_to_find == "digest.json" else "text/plain"
     digest_file_path = directory / internal_file_to_find
+    compressed_file_path = directory / (internal_file_to_find + ".gz")
+    # One stat per candidate; the result is also handed to FileResponse so it need not stat the file again
+    served_stat = _stat_regular_file(compressed_file_path)
+    is_compressed = served_stat is not None
+    if not is_compressed:
+        served_stat = _stat_regular_file(digest_file_path)
 
-    # Check if the directory and the determined file exist
-    if not directory.is_dir() or not digest_file_path.is_file():
+    # Check if the determined file exists (a missing directory fails the same stat)
+    if served_stat is None:
         raise HTTPException(status_code=404, detail=f"Digest file {internal_file_to_find} not found for ID {digest_id}.")
 
     # Determine the filename for the Content-Disposition header
@@ -77,9 +138,26 @@ async def download_ingest(
             # If mismatch (e.g. requested digest.txt but internal is digest.json due to query),
             # it will use default_filename_on_error which matches internal_file_to_find.
 
+    if is_compressed:
+        if _accepts_gzip(request.headers.get("accept-encoding", "")):
+            # Send the stored bytes untouched; the client inflates them
+            return FileResponse(
+                path=compressed_file_path,
+                media_type=media_type_for_response,
+                filename=final_download_name,
+                headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"},
+                stat_result=served_stat,
+            )
+        return StreamingResponse(
+            _iter_decompressed(compressed_file_path),
+            media_type=media_type_for_response,
+            headers={"Content-Disposition": _content_disposition(final_download_name), "Vary": "Accept-Encoding"},
+        )
+
     # Use FileResponse to efficiently send the file
     return FileResponse(
         path=digest_file_path,
         media_type=media_type_for_response,
-        filename=final_download_name
+        filename=final_download_name,
+        stat_result=served_stat,
     )
@@ -2,17 +2,21 @@
 """This module defines the dynamic router for handling dynamic path requests."""
 
 from fastapi import APIRouter, Form, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 
 from server.query_processor import process_query
 from server.server_config import templates
-from server.server_utils import limiter
+from server.server_utils import PAGE_CACHE_CONTROL, limiter, not_modified_response, page_etag
 
 router = APIRouter()
 
+# Root-level files browsers and crawlers ask for that can never name a repository; /robots.txt and
+# /static are served by main.py, so these are the ones that would otherwise fall through to catch_all
+_NON_REPO_PATHS = frozenset({"favicon.ico", "apple-touch-icon.png", "apple-touch-icon-precomposed.png", "sitemap.xml"})
+
 
 @router.get("/{full_path:path}")
-async def catch_all(request: Request, full_path: str) -> HTMLResponse:
+async def catch_all(request: Request, full_path: str) -> Response:
     """
     Render a page with a Git URL based on the provided path.
 
@@ -28,14 +32,21 @@ async def catch_all(request: Request, full_path: str) -> HTMLResponse:
 
     Returns
     -------
-    HTMLResponse
+    Response
         An HTML response containing the rendered template, with the Git URL
-        and other default parameters such as loading state and file size.
+        and other default parameters such as loading state and file size,
+        an empty 304 if the client's cached copy is current, or an empty 404
+        for paths that cannot name a repository.
     """
+    # Skip the template render for crawler noise: well-known files and dot-paths
+    # (.well-known/, .git/config, .env, ...) never start with a valid owner name
+    if full_path in _NON_REPO_PATHS or full_path.startswith("."):
+        return Response(status_code=404)
+
     # Note: Branch/tag cannot be easily pre-filled from GET request path here
     # without more complex parsing logic separate from the core parsing.
     # It will be empty on initial load via GET.
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         "git.jinja",
         {
             "request": request,
@@ -47,6 +58,14 @@ async def catch_all(request: Request, full_path: str) -> HTMLResponse:
             "pattern_type": "exclude", # Default pattern type
         },
     )
+    # The page is a pure function of the path, so a client revalidating its copy gets an empty 304
+    etag = page_etag(response.body)
+    not_modified = not_modified_response(request, etag)
+    if not_modified is not None:
+        return not_modified
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = PAGE_CACHE_CONTROL
+    return response
 
 
 @router.post("/{full_path:path}", response_class=HTMLResponse)
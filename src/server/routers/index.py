@@ -1,20 +1,78 @@
 # src/server/routers/index.py
+import asyncio
+import os
+import secrets
 import shutil
-import uuid
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Optional, Tuple
 from fastapi import APIRouter, Form, Request, File, UploadFile
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 
-from server.query_processor import process_query, RAW_UPLOADS_PATH # Import RAW_UPLOADS_PATH
-from server.server_config import EXAMPLE_REPOS, templates
-from server.server_utils import limiter
+from server.query_processor import ensure_upload_dirs, process_query, RAW_UPLOADS_PATH # Import RAW_UPLOADS_PATH
+from server.server_config import EXAMPLE_REPOS, MAX_UPLOAD_SIZE, templates
+from server.server_utils import PAGE_CACHE_CONTROL, limiter, not_modified_response, page_etag
 
 router = APIRouter()
 
+# Starlette has already spooled the upload to a temporary file; copy it out in large chunks
+_UPLOAD_COPY_CHUNK_SIZE = 1024 * 1024
+_UPLOAD_SENDFILE_CHUNK_SIZE = 64 * 1024 * 1024
+
+# The rate limit counts arrivals, not uploads in progress: cap how many are copied to disk at once so a burst
+# of large ZIPs cannot tie up the default executor shared with page renders and digest writes
+_UPLOAD_SAVE_SLOTS = asyncio.Semaphore(4)
+
+# Rendered home page bodies and their ETags, keyed by request URL (og:url echoes it) and kept in LRU order
+_HOME_PAGE_CACHE: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+_HOME_PAGE_CACHE_SIZE = 64
+
+
+def _save_upload(source: BinaryIO, dest: Path) -> None:
+    """Copy a spooled upload to ``dest`` under RAW_UPLOADS_PATH, recreating the upload directories if needed."""
+    ensure_upload_dirs()
+    try:
+        buffer = open(dest, "wb")
+    except FileNotFoundError:
+        ensure_upload_dirs(recheck=True) # Removed by the cleanup task since first use
+        buffer = open(dest, "wb")
+    with buffer:
+        # Uploads past Starlette's spool limit already sit in an unnamed temporary file (the same private
+        # _rolled flag Starlette's UploadFile checks): copy those in the kernel, without passing through Python
+        if getattr(source, "_rolled", False) and hasattr(os, "sendfile"):
+            offset = source.tell()
+            try:
+                while sent := os.sendfile(buffer.fileno(), source.fileno(), offset, _UPLOAD_SENDFILE_CHUNK_SIZE):
+                    offset += sent
+                return
+            except OSError:
+                source.seek(offset) # sendfile(2) not supported here: copy the rest in user space
+        shutil.copyfileobj(source, buffer, _UPLOAD_COPY_CHUNK_SIZE)
+
+
 @router.get("/", response_class=HTMLResponse)
-async def home(request: Request) -> HTMLResponse:
-    return templates.TemplateResponse( "index.jinja", { "request": request, "examples": EXAMPLE_REPOS, "default_file_size": 243, "branch_or_tag": "", "source_type": "url_path", }, )
+async def home(request: Request) -> Response:
+    # The page only varies with the request URL (og:url), so serve each URL's rendering from memory after the first
+    url = str(request.url)
+    cached = _HOME_PAGE_CACHE.get(url)
+    if cached is not None:
+        _HOME_PAGE_CACHE.move_to_end(url)
+        body, etag = cached
+    else:
+        response = templates.TemplateResponse( "index.jinja", { "request": request, "examples": EXAMPLE_REPOS, "default_file_size": 243, "branch_or_tag": "", "source_type": "url_path", }, )
+        body, etag = response.body, page_etag(response.body)
+        # Skipped while templates are being edited
+        if not templates.env.auto_reload:
+            _HOME_PAGE_CACHE[url] = (body, etag)
+            # Bounded (query strings make URLs arbitrary): drop the least recently served URL, so stray
+            # query strings cannot keep the plain home page out of the cache
+            if len(_HOME_PAGE_CACHE) > _HOME_PAGE_CACHE_SIZE:
+                _HOME_PAGE_CACHE.popitem(last=False)
+    # Revisits and refreshes that still hold this rendering get an empty 304
+    not_modified = not_modified_response(request, etag)
+    if not_modified is not None:
+        return not_modified
+    return HTMLResponse(body, headers={"ETag": etag, "Cache-Control": PAGE_CACHE_CONTROL})
 
 
 @router.post("/", response_class=HTMLResponse)
@@ -41,12 +99,27 @@ async def index_post(
                                        slider_position=max_file_size, pattern_type=pattern_type, pattern=pattern,
                                        branch_or_tag=branch_or_tag, download_format=download_format, is_index=True)
 
+        if zip_file.size is not None and zip_file.size > MAX_UPLOAD_SIZE:
+            # Refuse before copying: a single huge upload would otherwise hold a worker thread and the disk
+            await zip_file.close()
+            return templates.TemplateResponse(
+                "index.jinja",
+                {"request": request, "examples": EXAMPLE_REPOS, "default_file_size": max_file_size,
+                 "pattern_type": pattern_type, "pattern": pattern, "branch_or_tag": branch_or_tag, "source_type": source_type,
+                 "error_message": f"Uploaded ZIP file is too large (limit: {MAX_UPLOAD_SIZE // (1024 * 1024)} MB)."},
+                status_code=413,
+            )
+
         # --- Save uploaded ZIP to a temporary path ---
-        temp_zip_filename = f"{uuid.uuid4()}_{zip_file.filename}"
+        # Random prefix (no UUID formatting needed) and only the final component of the client's name:
+        # some clients send full paths, with either separator
+        upload_basename = os.path.basename(zip_file.filename.replace("\\", "/"))
+        temp_zip_filename = f"{secrets.token_hex(16)}_{upload_basename}"
         temp_zip_save_path = RAW_UPLOADS_PATH / temp_zip_filename
         try:
-            with open(temp_zip_save_path, "wb") as buffer:
-                shutil.copyfileobj(zip_file.file, buffer)
+            # Copying a multi-hundred-MB upload would otherwise block the event loop for every other request
+            async with _UPLOAD_SAVE_SLOTS:
+                await asyncio.to_thread(_save_upload, zip_file.file, temp_zip_save_path)
             # CRITICAL: actual_input_for_process_query IS NOW THE PATH TO THE SAVED ZIP
             actual_input_for_process_query = str(temp_zip_save_path)
         except Exception as e:
@@ -1,25 +1,38 @@
 # src/server/server_config.py
 """Configuration for the server."""
 
-from typing import Dict, List
+import os
+from typing import Tuple
 from pathlib import Path # Added Path
 # from jinja2 import Environment # No longer needed
 from fastapi.templating import Jinja2Templates # Keep this
 
+from CodeIngest.config import TMP_BASE_PATH
+
 MAX_DISPLAY_SIZE: int = 300_000
 DELETE_REPO_AFTER: int = 60 * 60  # In seconds
+MAX_UPLOAD_SIZE: int = 100 * 1024 * 1024  # Larger ZIP uploads are rejected before being copied or extracted
+
+# Content-addressed digest store shared by all ingests. The cleanup task skips it when sweeping ingest folders
+# and instead expires stored digests no ingest folder links to any more.
+DIGEST_STORE_PATH: Path = TMP_BASE_PATH / "store"
 
 # List of example repositories
-EXAMPLE_REPOS: List[Dict[str, str]] = [
-    {"name": "CodeIngest", "url": "https://github.com/Rlahuerta/CodeIngest"},
-    {"name": "FastAPI", "url": "https://github.com/tiangolo/fastapi"},
-    {"name": "Flask", "url": "https://github.com/pallets/flask"},
-    {"name": "Excalidraw", "url": "https://github.com/excalidraw/excalidraw"},
-    {"name": "ApiAnalytics", "url": "https://github.com/tom-draper/api-analytics"},
-]
+# Stored as (name, url) pairs so the template can unpack each row directly instead of doing two key lookups
+EXAMPLE_REPOS: Tuple[Tuple[str, str], ...] = (
+    ("CodeIngest", "https://github.com/Rlahuerta/CodeIngest"),
+    ("FastAPI", "https://github.com/tiangolo/fastapi"),
+    ("Flask", "https://github.com/pallets/flask"),
+    ("Excalidraw", "https://github.com/excalidraw/excalidraw"),
+    ("ApiAnalytics", "https://github.com/tom-draper/api-analytics"),
+)
 
 # --- REVERTED: Initialize Jinja2Templates normally ---
 # Calculate absolute path to 'server/templates' relative to this config file's location
 TEMPLATE_DIR = Path(__file__).resolve().parent / "templates"
 templates = Jinja2Templates(directory=TEMPLATE_DIR)
+# Compiled templates are cached by the environment; without auto_reload, get_template (also run for every
+# include) returns them without stat()ing the source file on each render. Set TEMPLATES_AUTO_RELOAD=1 while
+# editing templates.
+templates.env.auto_reload = os.getenv("TEMPLATES_AUTO_RELOAD", "").lower() in ("1", "true", "yes")
 # --- END REVERT ---
\ No newline at end of file
@@ -1,12 +1,15 @@
 """Utility functions for the server."""
 
 import asyncio
+import hashlib
 import math
+import os
 import shutil
 import time
 import logging
 from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import List, Optional
 
 from fastapi import FastAPI, Request
 from fastapi.responses import Response
@@ -15,13 +18,16 @@ from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 
 from CodeIngest.config import TMP_BASE_PATH
-from server.server_config import DELETE_REPO_AFTER
+from server.server_config import DELETE_REPO_AFTER, DIGEST_STORE_PATH
 
 # Initialize a rate limiter
 limiter = Limiter(key_func=get_remote_address)
 
 logger = logging.getLogger(__name__)
 
+# Browsers and proxies may reuse a rendered page for this long before revalidating it with If-None-Match
+PAGE_CACHE_CONTROL = "public, max-age=60"
+
 
 async def rate_limit_exception_handler(request: Request, exc: Exception) -> Response:
     """
@@ -51,6 +57,37 @@ async def rate_limit_exception_handler(request: Request, exc: Exception) -> Resp
     raise exc
 
 
+def page_etag(body: bytes) -> str:
+    """Return a weak ETag for a rendered page body."""
+    return f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+
+def not_modified_response(request: Request, etag: str) -> Optional[Response]:
+    """
+    Return a 304 response if the request's If-None-Match header already names `etag`.
+
+    Parameters
+    ----------
+    request : Request
+        The incoming HTTP request.
+    etag : str
+        The ETag of the page that would be served.
+
+    Returns
+    -------
+    Optional[Response]
+        An empty 304 response carrying the page's caching headers, or None if the page must be sent.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return None
+    # Weak comparison (RFC 9110 13.1.2): the W/ prefix is ignored on both sides
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in candidates or etag.removeprefix("W/") in candidates:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": PAGE_CACHE_CONTROL})
+    return None
+
+
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     """
@@ -85,8 +122,10 @@ async def _remove_old_repositories():
 
     This task:
     - Scans the TMP_BASE_PATH directory every 60 seconds
-    - Removes directories older than DELETE_REPO_AFTER seconds
-    - Before deletion, logs repository URLs to history.txt if a matching .txt file exists
+    - Removes directories older than DELETE_REPO_AFTER seconds, except the digest store
+    - Removes stored digests older than DELETE_REPO_AFTER seconds that no remaining directory links to
+    - Before deletion, reads repository URLs from matching .txt files and appends them to history.txt
+      in one write per sweep
     - Handles errors gracefully if deletion fails
 
     The repository URL is extracted from the first .txt file in each directory,
@@ -94,18 +133,21 @@ async def _remove_old_repositories():
     """
     while True:
         try:
-            if not TMP_BASE_PATH.exists():
-                await asyncio.sleep(60)
-                continue
+            # The scan stats every entry; run it in a worker thread so slow storage cannot stall requests
+            expired_folders = await asyncio.to_thread(_list_expired_folders, time.time())
 
-            current_time = time.time()
+            repo_urls = []
+            for folder in expired_folders:
+                repo_url = await _process_folder(folder)
+                if repo_url:
+                    repo_urls.append(repo_url)
 
-            for folder in TMP_BASE_PATH.iterdir():
-                # Skip if folder is not old enough
-                if current_time - folder.stat().st_ctime <= DELETE_REPO_AFTER:
-                    continue
+            # One append per sweep rather than one open/write/close per deleted folder
+            if repo_urls:
+                await asyncio.to_thread(_append_history, repo_urls)
 
-                await _process_folder(folder)
+            # After the folders above are gone, so the digests they linked to count as unreferenced
+            await asyncio.to_thread(_remove_expired_digests, time.time())
 
         except Exception as exc:
             logger.error("Error in repository cleanup task: %s", exc, exc_info=True)
@@ -113,7 +155,87 @@ async def _remove_old_repositories():
         await asyncio.sleep(60)
 
 
-async def _process_folder(folder: Path) -> None:
+def _list_expired_folders(current_time: float) -> List[Path]:
+    """
+    List the folders directly under TMP_BASE_PATH created more than DELETE_REPO_AFTER seconds before `current_time`.
+
+    One scandir pass: DirEntry answers the directory check from the readdir data, leaving one stat per folder.
+    """
+    try:
+        with os.scandir(TMP_BASE_PATH) as entries:
+            return [
+                Path(entry.path) for entry in entries
+                if entry.is_dir(follow_symlinks=False) and entry.name != DIGEST_STORE_PATH.name
+                and current_time - entry.stat().st_ctime > DELETE_REPO_AFTER
+            ]
+    except FileNotFoundError:
+        return [] # Nothing has been ingested yet
+
+
+def _remove_expired_digests(current_time: float) -> None:
+    """
+    Remove stored digests last written more than DELETE_REPO_AFTER seconds before `current_time` that no ingest
+    folder links to any more (a link count of 1), along with temporary files left by interrupted writes.
+
+    A writer that loses the stored file between its existence check and its link writes it again.
+    """
+    try:
+        with os.scandir(DIGEST_STORE_PATH) as fan_out_dirs:
+            fan_out_paths = [entry.path for entry in fan_out_dirs if entry.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        return # No digest stored yet
+    for fan_out_path in fan_out_paths:
+        try:
+            with os.scandir(fan_out_path) as entries:
+                for entry in entries:
+                    stat_result = entry.stat(follow_symlinks=False)
+                    if current_time - stat_result.st_mtime <= DELETE_REPO_AFTER:
+                        continue
+                    if entry.name.endswith(".tmp") or stat_result.st_nlink == 1:
+                        os.unlink(entry.path)
+        except FileNotFoundError:
+            continue # Removed concurrently
+        except OSError as exc:
+            logger.warning("Error expiring stored digests in %s: %s", fan_out_path, exc)
+
+
+def _repository_url(folder: Path) -> Optional[str]:
+    """Return the repository named by the first ``owner-repo.txt`` file in `folder`, if any."""
+    try:
+        # Only the first .txt file is used, so stop scanning as soon as one turns up
+        with os.scandir(folder) as entries:
+            txt_entry = next(
+                (entry for entry in entries if entry.name.endswith(".txt") and entry.is_file(follow_symlinks=False)),
+                None,
+            )
+        if txt_entry is not None: # If there is a .txt file
+            original_filename = txt_entry.name # For logging
+            filename_stem = original_filename[: -len(".txt")]
+            if "-" in filename_stem:
+                owner, repo = filename_stem.split("-", 1)
+                return f"{owner}/{repo}"
+            # Log if filename doesn't contain a hyphen
+            logger.warning(
+                "Could not parse repository name from filename '%s' in folder %s. Expected 'owner-repo.txt' format.",
+                original_filename,
+                folder
+            )
+        # If no .txt files, there is nothing to log, no warning needed for that specifically
+    except Exception as exc: # Catches errors from scandir and file access
+        logger.warning("Error logging repository URL for %s: %s", folder, exc)
+    return None
+
+
+def _append_history(repo_urls: List[str]) -> None:
+    """Append `repo_urls` to history.txt, one per line, with a single open and write."""
+    try:
+        with open("history.txt", mode="a", encoding="utf-8") as history:
+            history.writelines(f"{repo_url}\n" for repo_url in repo_urls)
+    except Exception as exc: # Catches errors from open and write
+        logger.warning("Error writing %d repository URL(s) to history: %s", len(repo_urls), exc)
+
+
+async def _process_folder(folder: Path) -> Optional[str]:
     """
     Process a single folder for deletion and logging.
 
@@ -121,35 +243,35 @@ async def _process_folder(folder: Path) -> None:
     ----------
     folder : Path
         The path to the folder to be processed.
+
+    Returns
+    -------
+    Optional[str]
+        The ``owner/repo`` name to record in history.txt, or None if the folder did not name one.
     """
-    # Try to log repository URL before deletion
-    try:
-        txt_files = [f for f in folder.iterdir() if f.suffix == ".txt"]
-        if txt_files: # If there are .txt files
-            filename_stem = txt_files[0].stem # Use stem from the first .txt file found
-            original_filename = txt_files[0].name # For logging
-            if "-" in filename_stem:
-                owner, repo = filename_stem.split("-", 1)
-                repo_url = f"{owner}/{repo}"
-                with open("history.txt", mode="a", encoding="utf-8") as history:
-                    history.write(f"{repo_url}\n")
-            else:
-                # Log if filename doesn't contain a hyphen
-                logger.warning(
-                    "Could not parse repository name from filename '%s' in folder %s. Expected 'owner-repo.txt' format.",
-                    original_filename,
-                    folder
-                )
-        # If no .txt files, this block is skipped, no warning needed for that specifically
-    except Exception as exc: # Catches errors from iterdir, file access, open, write
-        logger.warning("Error logging repository URL for %s: %s", folder, exc)
+    # Read the repository URL before deletion; listing the folder is disk I/O, so it runs in a worker
+    # thread like the deletion below (one folder at a time, so at most one thread)
+    repo_url = await asyncio.to_thread(_repository_url, folder)
 
-    # Delete the folder
+    # Delete the folder (one unlink per file, so off the event loop)
     try:
-        shutil.rmtree(folder)
+        await asyncio.to_thread(shutil.rmtree, folder)
     except Exception as exc:
         logger.error("Error deleting folder %s: %s", folder, exc, exc_info=True)
 
+    return repo_url
+
+
+def _slider_size(position: int) -> int:
+    maxp = 500
+    minv = math.log(1)
+    maxv = math.log(102_400)
+    return round(math.exp(minv + (maxv - minv) * pow(position / maxp, 1.5))) * 1024
+
+
+# The slider has only 501 positions: every size is computed once, at import
+_SLIDER_SIZES = tuple(_slider_size(position) for position in range(501))
+
 
 def log_slider_to_size(position: int) -> int:
     """
@@ -158,14 +280,12 @@ def log_slider_to_size(position: int) -> int:
     Parameters
     ----------
     position : int
-        Slider position ranging from 0 to 500.
+        Slider position ranging from 0 to 500. Out-of-range values (the form field is client-controlled)
+        are clamped to that range.
 
     Returns
     -------
     int
         File size in bytes corresponding to the slider position.
     """
-    maxp = 500
-    minv = math.log(1)
-    maxv = math.log(102_400)
-    return round(math.exp(minv + (maxv - minv) * pow(position / maxp, 1.5))) * 1024
+    return _SLIDER_SIZES[min(max(position, 0), 500)]
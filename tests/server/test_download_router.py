@@ -1,3 +1,4 @@
+import gzip
 import shutil
 import uuid
 import json # Added import
@@ -7,7 +8,9 @@ from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
 # from src.server.main import app # Using isolated app
-from src.server.routers.download import router as download_router # Import the specific router
+import pytest
+
+from src.server.routers.download import _accepts_gzip, router as download_router # Import the specific router
 from src.CodeIngest.config import TMP_BASE_PATH
 
 # Ensure the base temporary path for digests exists before tests run
@@ -142,3 +145,91 @@ def test_download_json_digest_file_missing_in_dir():
     finally:
         if digest_dir.exists():
             shutil.rmtree(digest_dir)
+
+def test_download_compressed_digest_sent_with_content_encoding():
+    test_digest_id = str(uuid.uuid4())
+    test_digest_content = "Compressed digest content.\n" * 100
+    digest_dir = TMP_BASE_PATH / test_digest_id
+    digest_dir.mkdir(parents=True, exist_ok=True)
+    with gzip.open(digest_dir / "digest.txt.gz", "wt", encoding="utf-8") as f:
+        f.write(test_digest_content)
+
+    try:
+        response = client.get(f"/download/{test_digest_id}?filename=repo_main.txt", headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert 'filename="repo_main.txt"' in response.headers["content-disposition"]
+        assert response.text == test_digest_content # httpx inflates the body
+    finally:
+        if digest_dir.exists():
+            shutil.rmtree(digest_dir)
+
+def test_download_compressed_digest_decompressed_for_client_without_gzip():
+    test_digest_id = str(uuid.uuid4())
+    test_digest_content = "Plain for this client."
+    digest_dir = TMP_BASE_PATH / test_digest_id
+    digest_dir.mkdir(parents=True, exist_ok=True)
+    with gzip.open(digest_dir / "digest.txt.gz", "wt", encoding="utf-8") as f:
+        f.write(test_digest_content)
+
+    try:
+        response = client.get(f"/download/{test_digest_id}", headers={"Accept-Encoding": "identity"})
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+        assert 'filename="digest.txt"' in response.headers["content-disposition"]
+        assert response.text == test_digest_content
+    finally:
+        if digest_dir.exists():
+            shutil.rmtree(digest_dir)
+
+def test_download_compressed_digest_filename_header_matches_for_both_encodings():
+    test_digest_id = str(uuid.uuid4())
+    digest_dir = TMP_BASE_PATH / test_digest_id
+    digest_dir.mkdir(parents=True, exist_ok=True)
+    with gzip.open(digest_dir / "digest.txt.gz", "wt", encoding="utf-8") as f:
+        f.write("content")
+
+    try:
+        url = f"/download/{test_digest_id}?filename=my%20repo.txt"
+        compressed = client.get(url, headers={"Accept-Encoding": "gzip"})
+        decompressed = client.get(url, headers={"Accept-Encoding": "identity"})
+        expected = "attachment; filename*=utf-8''my%20repo.txt" # Not filename="my%20repo.txt"
+        assert compressed.headers["content-disposition"] == expected
+        assert decompressed.headers["content-disposition"] == expected
+    finally:
+        if digest_dir.exists():
+            shutil.rmtree(digest_dir)
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip", True),
+    ("gzip, deflate, br", True),
+    ("br;q=1.0, gzip;q=0.8", True),
+    ("x-gzip", True),
+    ("*", True),
+    ("", False),
+    ("identity", False),
+    ("gzip;q=0", False),
+    ("gzip; q=0.000, deflate", False),
+    ("*;q=0", False),
+    ("gzip;q=0, *", False), # An explicit refusal wins over the wildcard
+    ("deflate, *;q=0.5", True),
+])
+def test_accepts_gzip(accept_encoding, expected):
+    assert _accepts_gzip(accept_encoding) is expected
+
+def test_download_compressed_digest_respects_gzip_refusal():
+    test_digest_id = str(uuid.uuid4())
+    digest_dir = TMP_BASE_PATH / test_digest_id
+    digest_dir.mkdir(parents=True, exist_ok=True)
+    with gzip.open(digest_dir / "digest.txt.gz", "wt", encoding="utf-8") as f:
+        f.write("refused")
+
+    try:
+        response = client.get(f"/download/{test_digest_id}", headers={"Accept-Encoding": "gzip;q=0"})
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+        assert response.text == "refused"
+    finally:
+        if digest_dir.exists():
+            shutil.rmtree(digest_dir)
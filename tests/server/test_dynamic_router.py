@@ -0,0 +1,42 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.server.routers.dynamic import router as dynamic_router
+
+# Create an isolated app for these tests
+test_app = FastAPI()
+test_app.include_router(dynamic_router)
+
+client = TestClient(test_app) # Use the isolated app
+
+
+def test_catch_all_renders_repo_page():
+    response = client.get("/owner/repo")
+    assert response.status_code == 200
+    assert b"owner/repo" in response.content
+
+
+@pytest.mark.parametrize(
+    "path",
+    ["/favicon.ico", "/sitemap.xml", "/.well-known/security.txt", "/.git/config", "/.env"],
+)
+def test_catch_all_rejects_non_repo_paths(path):
+    response = client.get(path)
+    assert response.status_code == 404
+    assert response.content == b"" # No template rendered
+
+
+def test_catch_all_revalidation_returns_not_modified():
+    first = client.get("/owner/repo")
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+    assert first.headers["cache-control"] == "public, max-age=60"
+
+    second = client.get("/owner/repo", headers={"If-None-Match": f'"other", {etag}'})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+
+    # A different path renders a different page, so the old ETag does not match
+    assert client.get("/owner/other", headers={"If-None-Match": etag}).status_code == 200
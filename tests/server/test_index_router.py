@@ -8,7 +8,7 @@ from pathlib import Path
 import io
 
 from src.CodeIngest.schemas import IngestionQuery # Not used in this file directly, but good for context
-from src.server.routers.index import router as index_router
+from src.server.routers.index import _HOME_PAGE_CACHE, router as index_router
 from src.server.query_processor import RAW_UPLOADS_PATH
 
 # Create an isolated app for these tests
@@ -17,11 +17,19 @@ test_app.include_router(index_router)
 
 client = TestClient(test_app) # Use the isolated app
 
+@pytest.fixture
+def no_rate_limit():
+    """Keep these requests from counting against the shared limiter used by later test modules."""
+    with patch("server.server_utils.limiter.enabled", False):
+        yield
+
+
 def test_get_home():
     response = client.get("/")
     assert response.status_code == 200
     assert b"Select Source Type:" in response.content
     assert b"Max File Size:" in response.content
+    assert b"submitExample('https://github.com/pallets/flask')" in response.content # Example buttons rendered
 
 async def test_post_index_zip_file_missing_no_mock():
     form_data = {
@@ -95,7 +103,7 @@ async def test_post_index_url_path_success(mock_process_query_instance):
     assert kwargs.get("branch_or_tag") == "main"
 
 @patch("src.server.routers.index.shutil.copyfileobj")
-@patch("src.server.routers.index.uuid.uuid4", return_value="test-uuid")
+@patch("src.server.routers.index.secrets.token_hex", return_value="test-uuid")
 @patch("src.server.routers.index.process_query", new_callable=AsyncMock)
 async def test_post_index_zip_file_success(mock_process_query, mock_uuid_func, mock_copyfileobj):
     mock_process_query.return_value = HTMLResponse(content="Success from ZIP", status_code=200)
@@ -124,7 +132,7 @@ async def test_post_index_zip_file_success(mock_process_query, mock_uuid_func, m
     assert kwargs.get("zip_file").filename == "test.zip"
 
 @patch("src.server.routers.index.shutil.copyfileobj") # Mock to raise error
-@patch("src.server.routers.index.uuid.uuid4", return_value="test-uuid-error") # Mock uuid
+@patch("src.server.routers.index.secrets.token_hex", return_value="test-uuid-error") # Mock the random prefix
 @patch("src.server.routers.index.process_query", new_callable=AsyncMock) # Mock process_query
 async def test_post_index_zip_file_save_error(mock_process_query, mock_uuid_func, mock_copyfileobj):
     mock_copyfileobj.side_effect = IOError("Disk full")
@@ -156,3 +164,90 @@ async def test_post_index_zip_file_save_error(mock_process_query, mock_uuid_func
 # TODO:
 # - Test successful url/path submission (covered by test_post_index_url_path_success)
 # - Test error during ZIP save (covered by test_post_index_zip_file_save_error)
+
+
+@pytest.mark.parametrize("size", [10, 3 * 1024 * 1024]) # Kept in memory / rolled over to disk
+def test_save_upload_copies_spooled_file(tmp_path, size):
+    from tempfile import SpooledTemporaryFile
+    from src.server.routers.index import _save_upload
+
+    payload = bytes(range(256)) * (size // 256 + 1)
+    spooled = SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(payload)
+    spooled.seek(0)
+
+    dest = tmp_path / "upload.zip"
+    with patch("src.server.routers.index.ensure_upload_dirs"):
+        _save_upload(spooled, dest)
+
+    assert dest.read_bytes() == payload
+
+
+@patch("src.server.routers.index.MAX_UPLOAD_SIZE", 10)
+@patch("src.server.routers.index.shutil.copyfileobj")
+@patch("src.server.routers.index.process_query", new_callable=AsyncMock)
+def test_post_index_zip_file_too_large(mock_process_query, mock_copyfileobj, no_rate_limit):
+    form_data = {"source_type": "zip_file", "max_file_size": "243", "pattern_type": "exclude", "pattern": "", "branch_or_tag": ""}
+    files_data = {"zip_file": ("big.zip", io.BytesIO(b"more than ten bytes"), "application/zip")}
+
+    response = client.post("/", data=form_data, files=files_data)
+
+    assert response.status_code == 413
+    assert b"Uploaded ZIP file is too large" in response.content
+    mock_copyfileobj.assert_not_called()
+    mock_process_query.assert_not_called()
+
+
+def test_get_home_reuses_rendered_page():
+    with patch.dict("src.server.routers.index._HOME_PAGE_CACHE", clear=True):
+        first = client.get("/")
+        with patch("src.server.routers.index.templates.TemplateResponse") as mock_template_response:
+            second = client.get("/")
+        mock_template_response.assert_not_called()
+    assert second.status_code == 200
+    assert second.content == first.content
+    assert second.headers["content-type"] == first.headers["content-type"]
+    assert second.headers["etag"] == first.headers["etag"]
+
+
+def test_get_home_cache_evicts_least_recently_served_url():
+    with patch.dict("src.server.routers.index._HOME_PAGE_CACHE", clear=True), \
+         patch("src.server.routers.index._HOME_PAGE_CACHE_SIZE", 2):
+        client.get("/")
+        client.get("/?x=1")
+        client.get("/") # Served from the cache, and now the most recently used
+        client.get("/?x=2")
+        assert list(_HOME_PAGE_CACHE) == ["http://testserver/", "http://testserver/?x=2"]
+
+        for n in range(3, 10):
+            client.get(f"/?x={n}")
+        client.get("/")
+        assert "http://testserver/" in _HOME_PAGE_CACHE # Still cached after the cache filled up
+        assert len(_HOME_PAGE_CACHE) == 2
+
+
+def test_get_home_revalidation_returns_not_modified():
+    with patch.dict("src.server.routers.index._HOME_PAGE_CACHE", clear=True):
+        etag = client.get("/").headers["etag"]
+        with patch("src.server.routers.index.templates.TemplateResponse") as mock_template_response:
+            response = client.get("/", headers={"If-None-Match": etag.removeprefix("W/")}) # Weak comparison
+        mock_template_response.assert_not_called()
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert response.headers["cache-control"] == "public, max-age=60"
+
+
+@pytest.mark.parametrize("client_filename", ["../../escape.zip", "C:\\Users\\me\\escape.zip"])
+@patch("src.server.routers.index.shutil.copyfileobj")
+@patch("src.server.routers.index.secrets.token_hex", return_value="prefix")
+@patch("src.server.routers.index.process_query", new_callable=AsyncMock)
+def test_post_index_zip_file_keeps_only_basename(mock_process_query, mock_token_hex, mock_copyfileobj, client_filename, no_rate_limit):
+    mock_process_query.return_value = HTMLResponse(content="ok", status_code=200)
+    form_data = {"source_type": "zip_file", "max_file_size": "243", "pattern_type": "exclude", "pattern": "", "branch_or_tag": ""}
+    files_data = {"zip_file": (client_filename, io.BytesIO(b"zip"), "application/zip")}
+
+    client.post("/", data=form_data, files=files_data)
+
+    _, kwargs = mock_process_query.call_args
+    assert kwargs.get("input_text") == str(RAW_UPLOADS_PATH / "prefix_escape.zip")
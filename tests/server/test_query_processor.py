@@ -1,16 +1,23 @@
+import asyncio
+import errno
+import gzip
 import pytest
+import shutil
 from unittest.mock import MagicMock, AsyncMock, patch
 from pathlib import Path
 import zipfile # For BadZipFile
 import io # For BytesIO in upcoming tests if needed
 import json # Added import
+import os
 
 from fastapi import Request, UploadFile
 from fastapi.responses import HTMLResponse
 from starlette.templating import _TemplateResponse as TemplateResponse
 from starlette.datastructures import FormData
 
-from src.server.query_processor import process_query, sanitize_filename_part
+from src.server.query_processor import (
+    _INFLIGHT_INGESTS, ValidatedQuery, _ingest_single_flight, _validate, _write_digest, process_query, sanitize_filename_part
+)
 from CodeIngest.schemas import IngestionQuery
 from CodeIngest.utils.exceptions import GitError, InvalidPatternError
 from CodeIngest.config import TMP_BASE_PATH
@@ -28,6 +35,22 @@ def mock_request(scope_type="http"):
 def test_sanitize_filename_part_empty():
     assert sanitize_filename_part("") == ""
 
+@pytest.mark.parametrize(
+    "part, expected",
+    [
+        ("my-repo_v1.2", "my-repo_v1.2"),
+        ("feature/new thing", "featurenew_thing"), # Reserved chars dropped, other runs become one "_"
+        ("a :  b", "a_b"),
+        ("  .hidden. ", "hidden"),
+        ("café naïve", "caf_na_ve"),
+        ("a__b", "a__b"), # Existing underscores are kept as-is
+        ("x" * 60, "x" * 50),
+        ("b/" * 100_000, "b" * 50), # Oversized input is cut before scanning
+    ],
+)
+def test_sanitize_filename_part_replaces_unsafe_characters(part, expected):
+    assert sanitize_filename_part(part) == expected
+
 @pytest.mark.asyncio
 async def test_process_query_url_path_missing_input_text():
     req = mock_request()
@@ -43,6 +66,21 @@ async def test_process_query_url_path_missing_input_text():
     assert isinstance(response, TemplateResponse)
     assert "Please provide a URL or local path." in response.body.decode()
 
+@pytest.mark.asyncio
+async def test_process_query_url_path_missing_input_text_git_page():
+    req = mock_request()
+    response = await process_query(
+        request=req,
+        source_type="url_path",
+        input_text=None,
+        zip_file=None,
+        slider_position=243,
+        is_index=False
+    )
+    assert response.status_code == 400
+    assert response.template.name == "git.jinja"
+    assert list(response.context["examples"]) == []
+
 @pytest.mark.asyncio
 async def test_process_query_zip_file_missing_path():
     req = mock_request()
@@ -96,10 +134,10 @@ async def test_process_query_invalid_source_type():
     assert "Invalid source type specified." in response.body.decode()
 
 @pytest.mark.asyncio
-@patch("src.server.query_processor.os.makedirs")
-@patch("src.server.query_processor.open", new_callable=MagicMock)
+@patch("src.server.query_processor.Path.mkdir", autospec=True)
+@patch("src.server.query_processor._write_digest")
 @patch("src.server.query_processor.ingest_async", new_callable=AsyncMock)
-async def test_process_query_success_url_path(mock_ingest_async, mock_open, mock_makedirs):
+async def test_process_query_success_url_path(mock_ingest_async, mock_write_digest, mock_mkdir):
     req = mock_request()
     mock_query_id = "test-ingest-id"
     mock_repo_slug = "successful-repo"
@@ -132,9 +170,6 @@ async def test_process_query_success_url_path(mock_ingest_async, mock_open, mock
     }
     mock_ingest_async.return_value = mock_ingestion_result
 
-    mock_file_handle = MagicMock()
-    mock_open.return_value.__enter__.return_value = mock_file_handle
-
     response = await process_query(
         request=req,
         source_type="url_path",
@@ -160,13 +195,15 @@ async def test_process_query_success_url_path(mock_ingest_async, mock_open, mock
     assert context["base_repo_url"] == mock_repo_url
     assert context["repo_ref"] == "main"
     expected_digest_dir = TMP_BASE_PATH / mock_query_id
-    mock_makedirs.assert_called_once_with(expected_digest_dir, exist_ok=True)
+    mock_mkdir.assert_called_once_with(expected_digest_dir, parents=True, exist_ok=True)
     # Default download_format is 'txt', so digest.txt is expected
-    mock_open.assert_called_once_with(expected_digest_dir / "digest.txt", "w", encoding="utf-8")
+    mock_write_digest.assert_called_once()
+    digest_path_arg, digest_chunks_arg = mock_write_digest.call_args[0]
+    assert digest_path_arg == expected_digest_dir / "digest.txt"
 
     # Construct the expected content string using values from mock_ingestion_result
     expected_file_content = f"Directory structure:\n{mock_dir_structure_text}\n\n{mock_content_str}"
-    mock_file_handle.write.assert_called_once_with(expected_file_content)
+    assert "".join(digest_chunks_arg) == expected_file_content
 
     mock_ingest_async.assert_called_once()
     call_kwargs = mock_ingest_async.call_args.kwargs
@@ -176,10 +213,10 @@ async def test_process_query_success_url_path(mock_ingest_async, mock_open, mock
     assert call_kwargs.get("max_file_size") == expected_max_file_size
 
 @pytest.mark.asyncio
-@patch("src.server.query_processor.os.makedirs")
-@patch("src.server.query_processor.open", new_callable=MagicMock)
+@patch("src.server.query_processor.Path.mkdir", autospec=True)
+@patch("src.server.query_processor._write_digest")
 @patch("src.server.query_processor.ingest_async", new_callable=AsyncMock)
-async def test_process_query_success_url_path_include_pattern(mock_ingest_async, mock_open, mock_makedirs):
+async def test_process_query_success_url_path_include_pattern(mock_ingest_async, mock_write_digest, mock_mkdir):
     req = mock_request()
     mock_query_obj = MagicMock(spec=IngestionQuery, id="test-id-include", slug="include-repo", url="http://example.com/include", branch="dev", commit=None)
     # mock_query_obj.repo_name = "include-repo" # Not strictly needed for this test's assertions
@@ -187,10 +224,10 @@ async def test_process_query_success_url_path_include_pattern(mock_ingest_async,
 
     minimal_mock_ingestion_result_include = {
         "summary_str": "Include Summary", "tree_data": [], "directory_structure_text": "",
-        "num_tokens": 0, "num_files": 0, "concatenated_content": "", "query_obj": mock_query_obj
+        "num_tokens": 0, "num_files": 0, "concatenated_content": "",
+        "query_obj": mock_query_obj
     }
     mock_ingest_async.return_value = minimal_mock_ingestion_result_include
-    mock_open.return_value.__enter__.return_value = MagicMock() # mock_open is for file writing, not directly asserted here
 
     await process_query(
         request=req,
@@ -216,7 +253,8 @@ async def test_process_query_ingest_async_returns_no_query_id(mock_ingest_async)
 
     mock_ingestion_result_no_id = {
         "summary_str": "Summary No ID", "tree_data": [], "directory_structure_text": "",
-        "num_tokens": 0, "num_files": 0, "concatenated_content": "", "query_obj": mock_query_obj_no_id
+        "num_tokens": 0, "num_files": 0, "concatenated_content": "",
+        "query_obj": mock_query_obj_no_id
     }
     mock_ingest_async.return_value = mock_ingestion_result_no_id
 
@@ -237,7 +275,8 @@ async def test_process_query_ingest_async_returns_no_query_id(mock_ingest_async)
 
     mock_ingestion_result_none_obj = {
         "summary_str": "Summary None Obj", "tree_data": [], "directory_structure_text": "",
-        "num_tokens": 0, "num_files": 0, "concatenated_content": "", "query_obj": None
+        "num_tokens": 0, "num_files": 0, "concatenated_content": "",
+        "query_obj": None
     }
     mock_ingest_async.return_value = mock_ingestion_result_none_obj
 
@@ -271,10 +310,10 @@ async def test_process_query_invalid_pattern_type_direct_call():
         )
 
 @pytest.mark.asyncio
-@patch("src.server.query_processor.os.makedirs")
-@patch("src.server.query_processor.open", new_callable=MagicMock)
+@patch("src.server.query_processor.Path.mkdir", autospec=True)
+@patch("src.server.query_processor._write_digest")
 @patch("src.server.query_processor.ingest_async", new_callable=AsyncMock)
-async def test_process_query_success_local_path_is_local_true(mock_ingest_async, mock_open, mock_makedirs):
+async def test_process_query_success_local_path_is_local_true(mock_ingest_async, mock_write_digest, mock_mkdir):
     req = mock_request()
     mock_query_obj = MagicMock(spec=IngestionQuery, id="local-id", slug="local-folder", url=None, branch=None, commit=None)
 
@@ -288,7 +327,6 @@ async def test_process_query_success_local_path_is_local_true(mock_ingest_async,
         "query_obj": mock_query_obj
     }
     mock_ingest_async.return_value = mock_ingestion_result_local
-    mock_open.return_value.__enter__.return_value = MagicMock() # Mock for file writing
 
     response = await process_query(
         request=req,
@@ -369,10 +407,10 @@ async def test_process_query_handles_generic_exception_from_ingest(mock_ingest_a
     assert "An unexpected error occurred while processing" in response.context["error_message"]
 
 @pytest.mark.asyncio
-@patch("src.server.query_processor.os.makedirs")
-@patch("src.server.query_processor.open", new_callable=MagicMock)
+@patch("src.server.query_processor.Path.mkdir", autospec=True)
+@patch("src.server.query_processor._write_digest")
 @patch("src.server.query_processor.ingest_async", new_callable=AsyncMock)
-async def test_process_query_digest_write_os_error(mock_ingest_async, mock_open, mock_makedirs):
+async def test_process_query_digest_write_os_error(mock_ingest_async, mock_write_digest, mock_mkdir):
     req = mock_request()
     mock_query_obj = MagicMock(spec=IngestionQuery, id="os-error-id", slug="os-error-repo", url="http://example.com/os-error", branch="main", commit=None)
 
@@ -386,7 +424,7 @@ async def test_process_query_digest_write_os_error(mock_ingest_async, mock_open,
         "query_obj": mock_query_obj
     }
     mock_ingest_async.return_value = mock_ingestion_result_os_error
-    mock_open.side_effect = OSError("Disk is full or something") # Simulate error during file write
+    mock_write_digest.side_effect = OSError("Disk is full or something") # Simulate error during file write
 
     response = await process_query(
         request=req, source_type="url_path", input_text="http://example.com/os-error",
@@ -404,20 +442,20 @@ async def test_process_query_digest_write_os_error(mock_ingest_async, mock_open,
     assert response.context.get("encoded_download_filename") is None
 
 @pytest.mark.asyncio
-@patch("src.server.query_processor.os.makedirs")
-@patch("src.server.query_processor.open", new_callable=MagicMock)
+@patch("src.server.query_processor.Path.mkdir", autospec=True)
+@patch("src.server.query_processor._write_digest")
 @patch("src.server.query_processor.ingest_async", new_callable=AsyncMock)
-async def test_process_query_filename_gen_with_commit_hash(mock_ingest_async, mock_open, mock_makedirs):
+async def test_process_query_filename_gen_with_commit_hash(mock_ingest_async, mock_write_digest, mock_mkdir):
     req = mock_request()
     commit_hash = "abcdef1234567890"
     mock_query_obj = MagicMock(spec=IngestionQuery, id="commit-id", slug="commit-repo", url="http://example.com/commit-repo", branch=None, commit=commit_hash)
 
     mock_ingestion_result_commit = {
         "summary_str": "Summary Commit Hash", "tree_data": [], "directory_structure_text": "",
-        "num_tokens": 0, "num_files": 0, "concatenated_content": "", "query_obj": mock_query_obj
+        "num_tokens": 0, "num_files": 0, "concatenated_content": "",
+        "query_obj": mock_query_obj
     }
     mock_ingest_async.return_value = mock_ingestion_result_commit
-    mock_open.return_value.__enter__.return_value = MagicMock() # Mock for file writing
 
     response = await process_query(
         request=req,
@@ -443,10 +481,10 @@ async def test_process_query_filename_gen_with_commit_hash(mock_ingest_async, mo
 # - Test specific MAX_DISPLAY_SIZE cropping for content (covered by success_url_path and success_json_download via context["content"])
 
 @pytest.mark.asyncio
-@patch("src.server.query_processor.os.makedirs")
-@patch("src.server.query_processor.open", new_callable=MagicMock)
+@patch("src.server.query_processor.Path.mkdir", autospec=True)
+@patch("src.server.query_processor._write_digest")
 @patch("src.server.query_processor.ingest_async", new_callable=AsyncMock)
-async def test_process_query_success_json_download(mock_ingest_async, mock_open, mock_makedirs):
+async def test_process_query_success_json_download(mock_ingest_async, mock_write_digest, mock_mkdir):
     req = mock_request()
     mock_query_id = "test-json-id"
     mock_repo_slug = "json-repo"
@@ -459,9 +497,9 @@ async def test_process_query_success_json_download(mock_ingest_async, mock_open,
     mock_query_obj.branch = "main"
     mock_query_obj.commit = "abc123xyz" # Example commit
 
-    # Define the dictionary that model_dump(mode='json') is expected to return
+    # Define the dictionary that model_dump(mode='json', include=...) is expected to return
     # This will be used by both the SUT and the test's assertion construction.
-    expected_query_dump_content = {"url": mock_repo_url, "branch": "main", "commit": "abc123xyz", "local_path": str(TMP_BASE_PATH / mock_query_id / mock_repo_slug)} # Example with a more realistic path
+    expected_query_dump_content = {"id": mock_query_id, "slug": mock_repo_slug, "url": mock_repo_url, "branch": "main", "commit": "abc123xyz", "subpath": "/"}
     mock_query_obj.model_dump.return_value = expected_query_dump_content
 
 
@@ -485,9 +523,6 @@ async def test_process_query_success_json_download(mock_ingest_async, mock_open,
     }
     mock_ingest_async.return_value = mock_ingestion_result
 
-    mock_file_handle = MagicMock()
-    mock_open.return_value.__enter__.return_value = mock_file_handle
-
     response = await process_query(
         request=req,
         source_type="url_path",
@@ -507,8 +542,10 @@ async def test_process_query_success_json_download(mock_ingest_async, mock_open,
     assert context["encoded_download_filename"].endswith(".json")
 
     expected_digest_dir = TMP_BASE_PATH / mock_query_id
-    mock_makedirs.assert_called_once_with(expected_digest_dir, exist_ok=True)
-    mock_open.assert_called_once_with(expected_digest_dir / "digest.json", "w", encoding="utf-8")
+    mock_mkdir.assert_called_once_with(expected_digest_dir, parents=True, exist_ok=True)
+    mock_write_digest.assert_called_once()
+    digest_path_arg, digest_chunks_arg = mock_write_digest.call_args[0]
+    assert digest_path_arg == expected_digest_dir / "digest.json"
 
     # Expected JSON structure for the saved file
     expected_metadata_obj = {
@@ -527,8 +564,252 @@ async def test_process_query_success_json_download(mock_ingest_async, mock_open,
     }
 
     # Capture what was written to file
-    written_content_str = mock_file_handle.write.call_args[0][0]
+    written_content_str = "".join(digest_chunks_arg)
     written_data = json.loads(written_content_str)
 
     assert written_data == expected_data_to_save
-    mock_query_obj.model_dump.assert_called_once_with(mode='json')
+    mock_query_obj.model_dump.assert_called_once_with(mode='json', include={"id", "slug", "url", "branch", "commit", "subpath"})
+
+@pytest.mark.asyncio
+@patch("src.server.query_processor.ingest_async", new_callable=AsyncMock)
+async def test_process_query_concurrent_identical_requests_share_ingestion(mock_ingest_async, tmp_path):
+    query_obj = IngestionQuery(
+        local_path=tmp_path / "clone", slug="shared-repo", id="shared-id", url="http://example.com/shared", branch="main"
+    )
+    ingestion_result = {
+        "summary_str": "Shared Summary", "tree_data": [], "directory_structure_text": "tree",
+        "num_tokens": 0, "num_files": 0, "concatenated_content": "content",
+        "query_obj": query_obj
+    }
+
+    async def slow_ingest(**kwargs):
+        await asyncio.sleep(0.01)
+        return ingestion_result
+
+    mock_ingest_async.side_effect = slow_ingest
+
+    # Real digest writes: followers must not collide with the leader (or each other) on disk
+    with patch("src.server.query_processor.TMP_BASE_PATH", tmp_path), \
+         patch("src.server.query_processor.DIGEST_STORE_PATH", tmp_path / "store"):
+        responses = await asyncio.gather(*(
+            process_query(
+                request=mock_request(), source_type="url_path", input_text="http://example.com/shared",
+                zip_file=None, slider_position=243, pattern_type="exclude", pattern="", branch_or_tag="main",
+                download_format=download_format, is_index=True
+            )
+            for download_format in ("txt", "txt", "json")
+        ))
+
+    mock_ingest_async.assert_called_once()
+    ingest_ids = [response.context["ingest_id"] for response in responses]
+    assert ingest_ids[0] == "shared-id" # The leader keeps the query's own id
+    assert len(set(ingest_ids)) == 3
+    for response, ingest_id, digest_name in zip(responses, ingest_ids, ("digest.txt.gz", "digest.txt.gz", "digest.json.gz")):
+        assert response.status_code == 200
+        assert response.context.get("error_message") is None
+        assert (tmp_path / ingest_id / digest_name).is_file()
+    assert query_obj.id == "shared-id" # Followers got copies; the leader's query is untouched
+
+@pytest.mark.asyncio
+@patch("src.server.query_processor.ingest_async", new_callable=AsyncMock)
+async def test_ingest_single_flight_follower_survives_leader_cancellation(mock_ingest_async, tmp_path):
+    query_obj = IngestionQuery(local_path=tmp_path / "clone", slug="shared-repo", id="leader-id")
+    release = asyncio.Event()
+
+    async def slow_ingest(**kwargs):
+        await release.wait()
+        return {"query_obj": query_obj}
+
+    mock_ingest_async.side_effect = slow_ingest
+
+    leader = asyncio.create_task(_ingest_single_flight(source="http://example.com/shared"))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(_ingest_single_flight(source="http://example.com/shared"))
+    await asyncio.sleep(0)
+
+    leader.cancel() # The leader's client disconnects mid-ingest
+    await asyncio.sleep(0)
+    release.set()
+    result = await follower
+
+    assert leader.cancelled()
+    assert not follower.cancelled()
+    assert result["query_obj"].slug == "shared-repo"
+    assert result["query_obj"].id != "leader-id"
+    mock_ingest_async.assert_called_once()
+    await asyncio.sleep(0) # Let the done callback run
+    assert not _INFLIGHT_INGESTS
+
+@pytest.mark.asyncio
+@patch("src.server.query_processor.Path.mkdir", autospec=True)
+@patch("src.server.query_processor._write_digest")
+@patch("src.server.query_processor.ingest_async", new_callable=AsyncMock)
+async def test_process_query_logs_estimated_tokens(mock_ingest_async, mock_write_digest, mock_mkdir, caplog):
+    mock_query_obj = MagicMock(spec=IngestionQuery, id="tokens-id", slug="repo", url="http://example.com/repo", branch="main", commit=None)
+    mock_ingest_async.return_value = {
+        "summary_str": "Repository: user/repo\nFiles analyzed: 3\n\nEstimated tokens: 1.2k", "tree_data": [],
+        "directory_structure_text": "", "num_tokens": 1200, "num_files": 3, "concatenated_content": "",
+        "query_obj": mock_query_obj
+    }
+
+    with caplog.at_level("INFO"):
+        response = await process_query(
+            request=mock_request(), source_type="url_path", input_text="http://example.com/repo",
+            zip_file=None, slider_position=243, pattern_type="exclude", pattern="", branch_or_tag="", is_index=True
+        )
+
+    assert response.status_code == 200
+    assert "Summary: Estimated tokens: 1200." in caplog.text
+
+@pytest.mark.asyncio
+@patch("src.server.query_processor.Path.mkdir", autospec=True)
+@patch("src.server.query_processor._write_digest")
+@patch("src.server.query_processor.ingest_async", new_callable=AsyncMock)
+async def test_process_query_renders_cropping_note_after_preview(mock_ingest_async, mock_write_digest, mock_mkdir):
+    mock_query_obj = MagicMock(spec=IngestionQuery, id="crop-id", slug="repo", url="http://example.com/repo", branch="main", commit=None)
+    mock_ingest_async.return_value = {
+        "summary_str": "Summary", "tree_data": [], "directory_structure_text": "",
+        "num_tokens": 0, "num_files": 1, "concatenated_content": "preview text and more",
+        "query_obj": mock_query_obj
+    }
+
+    with patch("src.server.query_processor.MAX_DISPLAY_SIZE", len("preview text")):
+        response = await process_query(
+            request=mock_request(), source_type="url_path", input_text="http://example.com/repo",
+            zip_file=None, slider_position=243, pattern_type="exclude", pattern="", branch_or_tag="", is_index=True
+        )
+
+    assert response.context["content"] == "preview text" # Passed without the note appended
+    assert "preview text\n(Files content cropped" in response.body.decode()
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("exc_message, expected_message", [
+    ("Local path not found: /nope", "Error: Local path not found: /nope"),
+    ("Repository not found, make sure it is public", "Error: Could not access '/nope'."),
+    ("Could not access the remote", "Error: Could not access '/nope'."),
+    ("Something odd", "Invalid input or configuration: Something odd"),
+])
+@patch("src.server.query_processor.ingest_async", new_callable=AsyncMock)
+async def test_process_query_classifies_value_errors(mock_ingest_async, exc_message, expected_message):
+    mock_ingest_async.side_effect = ValueError(exc_message)
+    response = await process_query(
+        request=mock_request(), source_type="url_path", input_text="/nope",
+        zip_file=None, slider_position=243, pattern_type="exclude", pattern="", branch_or_tag="", is_index=True
+    )
+    assert response.status_code == 400
+    assert response.context["error_message"].startswith(expected_message)
+
+
+def test_write_digest_shares_identical_digests(tmp_path):
+    store_dir = tmp_path / "store"
+    first_path = tmp_path / "id1" / "digest.txt"
+    second_path = tmp_path / "id2" / "digest.txt"
+    first_path.parent.mkdir()
+    second_path.parent.mkdir()
+
+    with patch("src.server.query_processor.DIGEST_STORE_PATH", store_dir):
+        _write_digest(first_path, ["Directory structure:\n", "tree", "\n\n", "content"])
+        _write_digest(second_path, iter(["Directory structure:\n", "tree", "\n\n", "content"]))
+
+    first_gz = tmp_path / "id1" / "digest.txt.gz"
+    second_gz = tmp_path / "id2" / "digest.txt.gz"
+    with gzip.open(first_gz, "rt", encoding="utf-8") as f:
+        assert f.read() == "Directory structure:\ntree\n\ncontent"
+    stored_files = [p for p in store_dir.rglob("*") if p.is_file()]
+    assert len(stored_files) == 1
+    assert first_gz.stat().st_ino == second_gz.stat().st_ino == stored_files[0].stat().st_ino
+
+
+def test_write_digest_twice_to_same_path(tmp_path):
+    store_dir = tmp_path / "store"
+    digest_path = tmp_path / "id1" / "digest.txt"
+    digest_path.parent.mkdir()
+
+    with patch("src.server.query_processor.DIGEST_STORE_PATH", store_dir):
+        _write_digest(digest_path, ["a", "b"])
+        _write_digest(digest_path, ["a", "b"]) # Already linked: must not fail
+
+    with gzip.open(tmp_path / "id1" / "digest.txt.gz", "rt", encoding="utf-8") as f:
+        assert f.read() == "ab"
+
+
+def test_write_digest_rewrites_digest_expired_before_link(tmp_path):
+    store_dir = tmp_path / "store"
+    (tmp_path / "id1").mkdir()
+    real_link = os.link
+
+    def expire_then_link(src, dst):
+        if not expire_then_link.expired:
+            expire_then_link.expired = True
+            os.unlink(src) # The cleanup task removes the stored digest after the existence check
+        return real_link(src, dst)
+    expire_then_link.expired = False
+
+    with patch("src.server.query_processor.DIGEST_STORE_PATH", store_dir), \
+         patch("src.server.query_processor.os.link", side_effect=expire_then_link):
+        _write_digest(tmp_path / "id1" / "digest.txt", ["rewritten"])
+
+    with gzip.open(tmp_path / "id1" / "digest.txt.gz", "rt", encoding="utf-8") as f:
+        assert f.read() == "rewritten"
+
+
+def test_write_digest_copies_without_hard_links(tmp_path):
+    store_dir = tmp_path / "store"
+    (tmp_path / "id1").mkdir()
+
+    with patch("src.server.query_processor.DIGEST_STORE_PATH", store_dir), \
+         patch("src.server.query_processor.os.link", side_effect=OSError(errno.EXDEV, "Invalid cross-device link")):
+        _write_digest(tmp_path / "id1" / "digest.txt", ["copied"])
+
+    with gzip.open(tmp_path / "id1" / "digest.txt.gz", "rt", encoding="utf-8") as f:
+        assert f.read() == "copied"
+
+
+def test_write_digest_keys_on_content(tmp_path):
+    store_dir = tmp_path / "store"
+    (tmp_path / "id1").mkdir()
+    (tmp_path / "id2").mkdir()
+
+    with patch("src.server.query_processor.DIGEST_STORE_PATH", store_dir):
+        _write_digest(tmp_path / "id1" / "digest.txt", ["one"])
+        _write_digest(tmp_path / "id2" / "digest.txt", ["two"])
+
+    assert len([p for p in store_dir.rglob("*") if p.is_file()]) == 2
+    with gzip.open(tmp_path / "id2" / "digest.txt.gz", "rt", encoding="utf-8") as f:
+        assert f.read() == "two"
+
+
+def test_write_digest_recreates_store_removed_by_cleanup(tmp_path):
+    store_dir = tmp_path / "store"
+    (tmp_path / "id1").mkdir()
+    (tmp_path / "id2").mkdir()
+
+    with patch("src.server.query_processor.DIGEST_STORE_PATH", store_dir):
+        _write_digest(tmp_path / "id1" / "digest.txt", ["same"])
+        shutil.rmtree(store_dir) # As the periodic cleanup task would
+        _write_digest(tmp_path / "id2" / "digest.txt", ["same"])
+
+    with gzip.open(tmp_path / "id2" / "digest.txt.gz", "rt", encoding="utf-8") as f:
+        assert f.read() == "same"
+
+def test_validate_resolves_zip_upload(tmp_path):
+    zip_path = tmp_path / "upload.zip"
+    zip_path.write_bytes(b"PK")
+    upload = MagicMock(spec=UploadFile)
+    upload.filename = "project.zip"
+
+    inputs = _validate(mock_request(), "zip_file", str(zip_path), upload, 243, "include", "*.py", "main", False)
+
+    assert isinstance(inputs, ValidatedQuery)
+    assert inputs.source_for_ingest == str(zip_path)
+    assert inputs.effective_input_display == "ZIP: project.zip"
+    assert inputs.include_patterns == "*.py" and inputs.exclude_patterns is None
+    assert inputs.branch_or_tag == "" # Not applicable to ZIPs
+    assert inputs.max_file_size == log_slider_to_size(243)
+    assert inputs.template == "git.jinja"
+
+@pytest.mark.parametrize("pattern", ["", "   ", "\t\n"])
+def test_validate_treats_blank_pattern_as_none(pattern):
+    inputs = _validate(mock_request(), "url_path", "https://github.com/user/repo", None, 243, "exclude", pattern, "", True)
+    assert isinstance(inputs, ValidatedQuery)
+    assert inputs.exclude_patterns is None and inputs.include_patterns is None
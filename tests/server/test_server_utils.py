@@ -1,5 +1,7 @@
 import pytest
 import math
+import os
+import time
 from unittest.mock import MagicMock, patch, mock_open as unittest_mock_open # Added mock_open
 from pathlib import Path # Added Path
 
@@ -8,7 +10,7 @@ from slowapi.errors import RateLimitExceeded
 from slowapi.wrappers import Limit as SlowAPILimit
 from starlette.responses import Response
 
-from src.server.server_utils import log_slider_to_size, rate_limit_exception_handler, _process_folder # Imported _process_folder
+from src.server.server_utils import log_slider_to_size, rate_limit_exception_handler, _list_expired_folders, _process_folder, _append_history, _remove_expired_digests # Imported _process_folder and _append_history
 
 # Tests for log_slider_to_size
 def test_log_slider_to_size_min_position():
@@ -49,41 +51,37 @@ async def test_rate_limit_exception_handler_reraises_other_exceptions():
     with pytest.raises(ValueError, match="Some other error"):
         await rate_limit_exception_handler(mock_req, other_exc)
 
+def test_log_slider_to_size_clamps_out_of_range_positions():
+    assert log_slider_to_size(-5) == log_slider_to_size(0)
+    assert log_slider_to_size(10_000) == log_slider_to_size(500)
+
 # Tests for _process_folder
 @pytest.mark.asyncio
 @patch("src.server.server_utils.shutil.rmtree")
 @patch("src.server.server_utils.open", new_callable=unittest_mock_open) # Mocks builtin open
-async def test_process_folder_success_logs_and_deletes(mock_open_builtin, mock_rmtree):
-    mock_folder = MagicMock(spec=Path)
-    mock_folder.name = "test_folder_to_delete"
-
-    mock_txt_file = MagicMock(spec=Path)
-    mock_txt_file.suffix = ".txt"
-    mock_txt_file.stem = "owner-repo"
-    mock_folder.iterdir.return_value = [mock_txt_file]
+async def test_process_folder_success_logs_and_deletes(mock_open_builtin, mock_rmtree, tmp_path):
+    folder = tmp_path / "test_folder_to_delete"
+    folder.mkdir()
+    (folder / "owner-repo.txt").write_text("digest")
 
-    await _process_folder(mock_folder)
+    assert await _process_folder(folder) == "owner/repo"
 
-    mock_open_builtin.assert_called_once_with("history.txt", mode="a", encoding="utf-8")
-    mock_file_handle = mock_open_builtin()
-    mock_file_handle.write.assert_called_once_with("owner/repo\n")
-
-    mock_rmtree.assert_called_once_with(mock_folder)
+    mock_open_builtin.assert_not_called() # history.txt is written once per sweep, not per folder
+    mock_rmtree.assert_called_once_with(folder)
 
 @pytest.mark.asyncio
 @patch("src.server.server_utils.shutil.rmtree")
 @patch("src.server.server_utils.open", new_callable=unittest_mock_open)
 @patch("src.server.server_utils.logger.warning")
-async def test_process_folder_unparsable_txt_name(mock_logger_warning, mock_open_builtin, mock_rmtree):
-    mock_folder = MagicMock(spec=Path, name="folder_unparsable")
-    mock_txt_file = MagicMock(spec=Path, suffix=".txt", stem="unparsable")
-    mock_txt_file.name = "unparsable.txt" # Set .name attribute for the log message
-    mock_folder.iterdir.return_value = [mock_txt_file]
+async def test_process_folder_unparsable_txt_name(mock_logger_warning, mock_open_builtin, mock_rmtree, tmp_path):
+    folder = tmp_path / "folder_unparsable"
+    folder.mkdir()
+    (folder / "unparsable.txt").write_text("digest")
 
-    await _process_folder(mock_folder)
+    await _process_folder(folder)
 
     mock_open_builtin.assert_not_called()
-    mock_rmtree.assert_called_once_with(mock_folder)
+    mock_rmtree.assert_called_once_with(folder)
     # Check for the new specific warning message
     assert any(
         call.args[0] == "Could not parse repository name from filename '%s' in folder %s. Expected 'owner-repo.txt' format." and
@@ -94,33 +92,35 @@ async def test_process_folder_unparsable_txt_name(mock_logger_warning, mock_open
 @pytest.mark.asyncio
 @patch("src.server.server_utils.shutil.rmtree")
 @patch("src.server.server_utils.open", new_callable=unittest_mock_open)
-async def test_process_folder_no_txt_files(mock_open_builtin, mock_rmtree):
-    mock_folder = MagicMock(spec=Path, name="folder_no_txt")
-    mock_other_file = MagicMock(spec=Path, suffix=".md")
-    mock_folder.iterdir.return_value = [mock_other_file]
+async def test_process_folder_no_txt_files(mock_open_builtin, mock_rmtree, tmp_path):
+    folder = tmp_path / "folder_no_txt"
+    folder.mkdir()
+    (folder / "README.md").write_text("# readme")
+    (folder / "owner-repo.txt").mkdir() # A directory named like a digest is not a digest
 
-    await _process_folder(mock_folder)
+    await _process_folder(folder)
     mock_open_builtin.assert_not_called()
-    mock_rmtree.assert_called_once_with(mock_folder)
+    mock_rmtree.assert_called_once_with(folder)
+
+@patch("src.server.server_utils.open", new_callable=unittest_mock_open)
+def test_append_history_writes_all_urls_at_once(mock_open_builtin):
+    _append_history(["owner/repo", "other/project"])
+
+    mock_open_builtin.assert_called_once_with("history.txt", mode="a", encoding="utf-8")
+    written = "".join(mock_open_builtin().writelines.call_args.args[0])
+    assert written == "owner/repo\nother/project\n"
 
-@pytest.mark.asyncio
-@patch("src.server.server_utils.shutil.rmtree")
 @patch("src.server.server_utils.open", new_callable=unittest_mock_open)
 @patch("src.server.server_utils.logger.warning")
-async def test_process_folder_history_write_os_error(mock_logger_warning, mock_open_builtin, mock_rmtree):
-    mock_folder = MagicMock(spec=Path, name="folder_history_error")
-    mock_txt_file = MagicMock(spec=Path, suffix=".txt", stem="owner-repo")
-    mock_folder.iterdir.return_value = [mock_txt_file]
+def test_append_history_os_error(mock_logger_warning, mock_open_builtin):
     mock_open_builtin.side_effect = OSError("Cannot write history")
 
-    await _process_folder(mock_folder)
+    _append_history(["owner/repo"]) # Must not raise
 
     mock_open_builtin.assert_called_once_with("history.txt", mode="a", encoding="utf-8")
-    mock_rmtree.assert_called_once_with(mock_folder)
-    # Assert based on the actual log call structure: logger.warning(message_format, folder_arg, exc_arg)
     assert any(
-        call.args[0] == "Error logging repository URL for %s: %s" and
-        "Cannot write history" in str(call.args[2]) # Exception is the third arg (index 2)
+        call.args[0] == "Error writing %d repository URL(s) to history: %s" and
+        "Cannot write history" in str(call.args[2])
         for call in mock_logger_warning.call_args_list
     )
 
@@ -128,16 +128,15 @@ async def test_process_folder_history_write_os_error(mock_logger_warning, mock_o
 @patch("src.server.server_utils.shutil.rmtree")
 @patch("src.server.server_utils.open", new_callable=unittest_mock_open)
 @patch("src.server.server_utils.logger.error")
-async def test_process_folder_rmtree_os_error(mock_logger_error, mock_open_builtin, mock_rmtree):
-    mock_folder = MagicMock(spec=Path, name="folder_rmtree_error")
-    mock_txt_file = MagicMock(spec=Path, suffix=".txt", stem="owner-repo-rmfail")
-    mock_folder.iterdir.return_value = [mock_txt_file]
+async def test_process_folder_rmtree_os_error(mock_logger_error, mock_open_builtin, mock_rmtree, tmp_path):
+    folder = tmp_path / "folder_rmtree_error"
+    folder.mkdir()
+    (folder / "owner-repo-rmfail.txt").write_text("digest")
     mock_rmtree.side_effect = OSError("Cannot delete folder")
 
-    await _process_folder(mock_folder)
+    assert await _process_folder(folder) == "owner/repo-rmfail" # Still recorded even if deletion fails
 
-    mock_open_builtin.assert_called_once_with("history.txt", mode="a", encoding="utf-8")
-    mock_rmtree.assert_called_once_with(mock_folder)
+    mock_rmtree.assert_called_once_with(folder)
     # Assert based on the actual log call structure: logger.error(message_format, folder_arg, exc_arg, exc_info=True)
     assert any(
         call.args[0] == "Error deleting folder %s: %s" and
@@ -145,4 +144,41 @@ async def test_process_folder_rmtree_os_error(mock_logger_error, mock_open_built
         for call in mock_logger_error.call_args_list
     )
 
+def test_list_expired_folders(tmp_path):
+    (tmp_path / "old_ingest").mkdir()
+    (tmp_path / "stray_file").write_text("not a folder")
+    (tmp_path / "store").mkdir()
+
+    with patch("src.server.server_utils.TMP_BASE_PATH", tmp_path), patch("src.server.server_utils.DELETE_REPO_AFTER", 60):
+        assert _list_expired_folders(time.time()) == [] # Not old enough yet
+        assert _list_expired_folders(time.time() + 120) == [tmp_path / "old_ingest"] # Files and the digest store are skipped
+
+
+def test_remove_expired_digests(tmp_path):
+    store_dir = tmp_path / "store"
+    fan_out_dir = store_dir / "ab"
+    fan_out_dir.mkdir(parents=True)
+    (tmp_path / "ingest").mkdir()
+    linked = fan_out_dir / "linked.gz"
+    unreferenced = fan_out_dir / "unreferenced.gz"
+    leftover_tmp = fan_out_dir / "linked.0123.tmp"
+    for path in (linked, unreferenced, leftover_tmp):
+        path.write_bytes(b"digest")
+    os.link(linked, tmp_path / "ingest" / "digest.txt.gz")
+
+    with patch("src.server.server_utils.DIGEST_STORE_PATH", store_dir), patch("src.server.server_utils.DELETE_REPO_AFTER", 60):
+        _remove_expired_digests(time.time()) # Nothing old enough yet
+        assert sorted(p.name for p in fan_out_dir.iterdir()) == ["linked.0123.tmp", "linked.gz", "unreferenced.gz"]
+
+        _remove_expired_digests(time.time() + 120)
+        assert [p.name for p in fan_out_dir.iterdir()] == ["linked.gz"] # Still linked from an ingest folder
+
+
+def test_remove_expired_digests_without_store(tmp_path):
+    with patch("src.server.server_utils.DIGEST_STORE_PATH", tmp_path / "store"):
+        _remove_expired_digests(time.time()) # Must not raise
+
+    with patch("src.server.server_utils.TMP_BASE_PATH", tmp_path / "missing"):
+        assert _list_expired_folders(time.time()) == []
+
 # TODO: Tests for _remove_old_repositories (more complex)
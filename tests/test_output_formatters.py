@@ -6,6 +6,7 @@ from pathlib import Path
 from CodeIngest.output_formatters import (
     _parse_token_estimate_str_to_int,
     _create_tree_data,
+    _gather_file_contents,
     format_node,
     # FormattedNodeData, # If it's a type alias, it might not be needed for tests directly
     # TreeDataItem # Same as above
@@ -332,3 +333,24 @@ def test_format_node_structure_and_data_assembly(
 
     # Verify concatenated_content_for_txt
     assert result_dict["concatenated_content_for_txt"] == mock_concatenated_content
+
+
+def _mock_content_node(node_type, content_string="", children=()):
+    node = MagicMock(spec=FileSystemNode)
+    node.type = node_type
+    type(node).content_string = PropertyMock(return_value=content_string)
+    node.children = list(children)
+    return node
+
+
+def test_gather_file_contents_joins_nested_files_with_newlines():
+    nested_dir = _mock_content_node(
+        FileSystemNodeType.DIRECTORY,
+        children=[_mock_content_node(FileSystemNodeType.FILE, "bbb"), _mock_content_node(FileSystemNodeType.FILE, "cccc")],
+    )
+    root = _mock_content_node(
+        FileSystemNodeType.DIRECTORY,
+        children=[_mock_content_node(FileSystemNodeType.FILE, "aaa"), nested_dir],
+    )
+
+    assert _gather_file_contents(root) == "aaa\nbbb\ncccc"
@@ -6,18 +6,29 @@ and handling edge cases such as nonexistent URLs, timeouts, redirects, and speci
 """
 
 import asyncio
+import io
 import os
+import stat
+import zipfile
 from pathlib import Path
 from unittest.mock import AsyncMock, patch
 
+import httpx
 import pytest
 
-from CodeIngest.cloning import check_repo_exists, clone_repo
+from CodeIngest.cloning import _download_github_archive, _extract_archive, check_repo_exists, clone_repo
 from CodeIngest.schemas import CloneConfig
 from CodeIngest.utils.exceptions import AsyncTimeoutError
 from CodeIngest.utils.git_utils import ensure_git_installed, fetch_remote_branch_list, run_command # Import functions to test
 
 
+@pytest.fixture(autouse=True)
+def no_github_archive():
+    """Exercise the `git clone` path: make the GitHub archive shortcut report that it did not apply."""
+    with patch("CodeIngest.cloning._download_github_archive", new_callable=AsyncMock, return_value=False) as mock_archive:
+        yield mock_archive
+
+
 @pytest.mark.asyncio
 async def test_clone_with_commit() -> None:
     """
@@ -624,3 +635,162 @@ async def test_fetch_remote_branch_list_git_failure() -> None:
                 await fetch_remote_branch_list(url)
             mock_run_command.assert_called_once_with("git", "ls-remote", "--heads", url)
 
+
+
+@pytest.mark.asyncio
+async def test_clone_uses_github_archive_when_available(no_github_archive) -> None:
+    """
+    Test that a GitHub snapshot without a pinned commit is fetched as an archive.
+
+    Given a GitHub URL, no commit and no subpath:
+    When `clone_repo` is called and the archive download succeeds,
+    Then no git command should be run.
+    """
+    clone_config = CloneConfig(url="https://github.com/user/repo", local_path="/tmp/repo", branch="dev")
+    no_github_archive.return_value = True
+
+    with patch("CodeIngest.cloning.check_repo_exists", return_value=True):
+        with patch("CodeIngest.cloning.run_command", new_callable=AsyncMock) as mock_exec:
+            with patch("os.makedirs", return_value=None):
+                await clone_repo(clone_config)
+
+    no_github_archive.assert_awaited_once_with("https://github.com/user/repo", "dev", "/tmp/repo")
+    mock_exec.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_clone_with_commit_skips_github_archive(no_github_archive) -> None:
+    """
+    Test that a pinned commit always goes through `git clone`.
+    """
+    clone_config = CloneConfig(url="https://github.com/user/repo", local_path="/tmp/repo", commit="a" * 40)
+
+    with patch("CodeIngest.cloning.check_repo_exists", return_value=True):
+        with patch("CodeIngest.cloning.run_command", new_callable=AsyncMock):
+            with patch("CodeIngest.cloning.ensure_git_installed", new_callable=AsyncMock):
+                with patch("os.makedirs", return_value=None):
+                    await clone_repo(clone_config)
+
+    no_github_archive.assert_not_called()
+
+
+def test_extract_archive_strips_top_level_directory(tmp_path: Path) -> None:
+    """
+    Test that the archive's single top-level directory becomes `local_path`.
+    """
+    archive_path = tmp_path / "archive.zip"
+    with zipfile.ZipFile(archive_path, "w") as zf:
+        zf.writestr("repo-main/README.md", "hello")
+        zf.writestr("repo-main/src/app.py", "print('hi')")
+    local_path = tmp_path / "repo"
+
+    _extract_archive(archive_path, local_path)
+
+    assert (local_path / "README.md").read_text() == "hello"
+    assert (local_path / "src" / "app.py").read_text() == "print('hi')"
+
+
+def test_extract_archive_rejects_unsafe_paths(tmp_path: Path) -> None:
+    """
+    Test that an archive entry escaping the extraction directory is rejected (Zip Slip).
+    """
+    archive_path = tmp_path / "archive.zip"
+    with zipfile.ZipFile(archive_path, "w") as zf:
+        zf.writestr("repo-main/../../evil.txt", "boom")
+
+    with pytest.raises(ValueError, match="unsafe path"):
+        _extract_archive(archive_path, tmp_path / "repo")
+
+    assert not (tmp_path.parent / "evil.txt").exists()
+
+
+def test_extract_archive_rejects_symlinks(tmp_path: Path) -> None:
+    """
+    Test that an archive with a symlink is rejected, so the repository is cloned with the link intact.
+    """
+    archive_path = tmp_path / "archive.zip"
+    link_info = zipfile.ZipInfo("repo-main/link")
+    link_info.create_system = 3 # Unix
+    link_info.external_attr = (stat.S_IFLNK | 0o777) << 16
+    with zipfile.ZipFile(archive_path, "w") as zf:
+        zf.writestr("repo-main/README.md", "hello")
+        zf.writestr(link_info, "README.md")
+
+    with pytest.raises(ValueError, match="symlink"):
+        _extract_archive(archive_path, tmp_path / "repo")
+
+    assert not (tmp_path / "repo").exists()
+
+
+@pytest.mark.parametrize("attributes", ["docs/ export-ignore\n", "version.py export-subst\n"])
+def test_extract_archive_rejects_export_attributes(tmp_path: Path, attributes: str) -> None:
+    """
+    Test that an archive shaped by `.gitattributes` export attributes is rejected, since it differs from a clone.
+    """
+    archive_path = tmp_path / "archive.zip"
+    with zipfile.ZipFile(archive_path, "w") as zf:
+        zf.writestr("repo-main/README.md", "hello")
+        zf.writestr("repo-main/.gitattributes", "*.py text\n" + attributes)
+
+    with pytest.raises(ValueError, match="export attributes"):
+        _extract_archive(archive_path, tmp_path / "repo")
+
+
+@pytest.mark.asyncio
+async def test_download_github_archive_unpacks_repository(tmp_path: Path) -> None:
+    """
+    Test that a downloaded archive is written to disk and unpacked into `local_path`.
+    """
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("repo-main/README.md", "hello")
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=archive.getvalue()))
+    real_client = httpx.AsyncClient
+    local_path = tmp_path / "repo"
+
+    with patch("CodeIngest.cloning.httpx.AsyncClient", lambda **kwargs: real_client(transport=transport, **kwargs)):
+        assert await _download_github_archive("https://github.com/user/repo", None, str(local_path)) is True
+
+    assert (local_path / "README.md").read_text() == "hello"
+    assert list(tmp_path.iterdir()) == [local_path] # The temporary download directory is gone
+
+
+async def _chunked_body():
+    for _ in range(20):
+        yield b"x" * 8
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("body", [b"x" * 160, _chunked_body], ids=["content-length", "chunked"])
+async def test_download_github_archive_enforces_size_limit(tmp_path: Path, body) -> None:
+    """
+    Test that an archive larger than MAX_ARCHIVE_SIZE is not downloaded in full, with or without a Content-Length.
+    """
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(200, content=body if isinstance(body, bytes) else body())
+    )
+    real_client = httpx.AsyncClient
+    local_path = tmp_path / "repo"
+
+    with patch("CodeIngest.cloning.MAX_ARCHIVE_SIZE", 64):
+        with patch("CodeIngest.cloning.httpx.AsyncClient", lambda **kwargs: real_client(transport=transport, **kwargs)):
+            assert await _download_github_archive("https://github.com/user/repo", None, str(local_path)) is False
+
+    assert not local_path.exists()
+    assert list(tmp_path.iterdir()) == [] # The partial download was removed with its temporary directory
+
+
+@pytest.mark.asyncio
+async def test_download_github_archive_times_out_separately(tmp_path: Path) -> None:
+    """
+    Test that a slow archive download gives up after ARCHIVE_TIMEOUT, so `git clone` can take over.
+    """
+    async def slow_fetch(archive_url: str, archive_path: Path) -> None:
+        await asyncio.sleep(10)
+
+    local_path = tmp_path / "repo"
+    with patch("CodeIngest.cloning.ARCHIVE_TIMEOUT", 0.01):
+        with patch("CodeIngest.cloning._fetch_archive", side_effect=slow_fetch):
+            assert await _download_github_archive("https://github.com/user/repo", None, str(local_path)) is False
+
+    assert not local_path.exists()
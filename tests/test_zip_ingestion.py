@@ -129,4 +129,16 @@ async def test_ingest_query_zip_invalid(tmp_path: Path, sample_query: IngestionQ
     invalid_zip_path = tmp_path / "corrupt.zip"
     invalid_zip_path.write_text("This is not a valid zip archive content.")
     with pytest.raises(zipfile.BadZipFile):
-        await parse_query(source=str(invalid_zip_path), max_file_size=sample_query.max_file_size, from_web=False)
\ No newline at end of file
+        await parse_query(source=str(invalid_zip_path), max_file_size=sample_query.max_file_size, from_web=False)
+
+@pytest.mark.asyncio
+async def test_ingest_query_zip_corrupt_member(tmp_path: Path, sample_query: IngestionQuery) -> None:
+    """Test parse_query rejects a ZIP whose member data fails its CRC check."""
+    zip_path = tmp_path / "crc.zip"
+    with zipfile.ZipFile(zip_path, 'w') as zipf: # Stored, so the payload bytes appear verbatim
+        zipf.writestr("file.txt", "original payload")
+    data = zip_path.read_bytes()
+    zip_path.write_bytes(data.replace(b"original payload", b"tampered payload"))
+
+    with pytest.raises(zipfile.BadZipFile, match="Invalid ZIP file"):
+        await parse_query(source=str(zip_path), max_file_size=sample_query.max_file_size, from_web=False)